@@ -1,17 +1,245 @@
+import calendar
+import hashlib
+import os
+import queue
+import re
 import sqlite3
+import threading
 import time
-from datetime import date, datetime, timedelta
+from contextlib import contextmanager
+from datetime import date, timedelta
+from app.utils import start_of_month, start_of_week_sun, start_of_year
+
+_DATE_RE = re.compile(r"([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})\Z")
+_TIME_RE = re.compile(r"([0-9]{1,2}):([0-9]{1,2})\Z")
+_SEARCH_WORD_RE = re.compile(r"\w+")
+
+
+def content_hash(date_str, time_str, item, amount, note):
+    key = "\x1f".join((date_str, time_str, item, str(int(amount)), note))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _WriteBehindQueue:
+    # commits queued inserts on one worker thread; saves that pile up while
+    # a commit is running all go into the next transaction together
+
+    MAX_BATCH = 200
+
+    def __init__(self, db):
+        self._db = db
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, row, on_done=None):
+        self._ensure_thread()
+        self._queue.put((row, on_done))
+
+    def pending(self):
+        return self._queue.unfinished_tasks
+
+    def flush(self):
+        if self._thread is not None:
+            self._queue.join()
+
+    def stop(self):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._loop, name="db-write-behind", daemon=True
+            )
+            self._thread.start()
+
+    def _loop(self):
+        stopping = False
+        try:
+            while not stopping:
+                batch = [self._queue.get()]
+                while len(batch) < self.MAX_BATCH:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stopping = None in batch
+                entries = [entry for entry in batch if entry is not None]
+                try:
+                    self._commit(entries)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            self._db.release()
+
+    def _commit(self, entries):
+        if not entries:
+            return
+
+        ids, error = [], None
+        try:
+            with self._db.connect() as connect:
+                for row, _ in entries:
+                    ids.append(self._db._insert_transaction(connect, row))
+                connect.commit()
+        except Exception as e:
+            ids, error = [None] * len(entries), e
+
+        if error is None:
+            self._db._notify_change("add", ids)
+
+        for (row, on_done), txid in zip(entries, ids):
+            if on_done:
+                try:
+                    on_done(txid, error)
+                except Exception:
+                    pass
 
 
 class DataBase:
-    def __init__(self, path="txtracker.sqlite3"):
+    SCHEMA_VERSION = 4
+    STATEMENT_CACHE_SIZE = 256
+    IMPORT_CHUNK_SIZE = 500
+
+    # largest amount SQLite can store; anything above it is not a real entry
+    MAX_AMOUNT = 2**63 - 1
+
+    # bulk writes rebuild the search index and item_stats once instead of
+    # updating them row by row when they add at least 1/16 of the rows
+    # already in the table; a rebuild costs about that much per existing row
+    INDEX_REBUILD_RATIO = 16
+
+    # applied to every new connection, in this order
+    DEFAULT_PRAGMAS = (
+        ("journal_mode", "WAL"),
+        ("synchronous", "NORMAL"),
+        ("cache_size", -8000),
+        ("mmap_size", 64 * 1024 * 1024),
+        ("temp_store", "MEMORY"),
+    )
+
+    def __init__(self, path="txtracker.sqlite3", pragmas=None):
         self.path = path
+        self.pragmas = tuple(
+            self.DEFAULT_PRAGMAS if pragmas is None else dict(pragmas).items()
+        )
+
+        # one long-lived connection per thread, reused by every call
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._closed = False
+
+        # called as callback(kind, ids) after every committed write to
+        # transactions; ids is None for bulk writes. writes queued with
+        # enqueue_transaction notify from the write-behind thread
+        self._change_listeners = []
+        self._write_queue = _WriteBehindQueue(self)
+
+        # whether transactions_fts can be queried; None until checked
+        self._fts = None
+
+    def add_change_listener(self, callback):
+        if callback not in self._change_listeners:
+            self._change_listeners.append(callback)
+
+    def remove_change_listener(self, callback):
+        if callback in self._change_listeners:
+            self._change_listeners.remove(callback)
+
+    def _notify_change(self, kind, ids=None):
+        for callback in list(self._change_listeners):
+            try:
+                callback(kind, ids)
+            except Exception:
+                pass
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def open(self):
+        self._closed = False
+        return self.connect()
+
+    def close(self):
+        # queued saves are committed before the connections go away
+        self._write_queue.stop()
+
+        with self._connections_lock:
+            self._closed = True
+            connections = self._connections
+            self._connections = []
+
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+        self._local = threading.local()
+
+    def release(self):
+        # worker threads call this before exiting so their connection
+        # does not outlive them
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            return
+
+        self._local.connection = None
+        with self._connections_lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+
+        try:
+            connection.close()
+        except Exception:
+            pass
 
     def connect(self):
-        connection = sqlite3.connect(self.path)
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            return connection
+
+        if self._closed:
+            raise sqlite3.ProgrammingError("Database is closed")
+
+        # check_same_thread is off only so close() can shut down every
+        # thread's connection; each connection is still used by one thread
+        connection = sqlite3.connect(
+            self.path,
+            cached_statements=self.STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+        )
         connection.row_factory = sqlite3.Row
+        self._apply_pragmas(connection)
+
+        with self._connections_lock:
+            self._connections.append(connection)
+        self._local.connection = connection
         return connection
 
+    def _apply_pragmas(self, connection):
+        for name, value in self.pragmas:
+            try:
+                connection.execute(f"PRAGMA {name} = {value}")
+            except sqlite3.DatabaseError:
+                pass
+
     def init_database(self):
         with self.connect() as connect:
             connect.execute(
@@ -24,32 +252,496 @@ class DataBase:
                     amount INTEGER NOT NULL,
                     note TEXT NOT NULL DEFAULT '',
                     created_at_ms INTEGER NOT NULL,
-                    deleted INTEGER NOT NULL DEFAULT 0
+                    deleted INTEGER NOT NULL DEFAULT 0,
+                    content_hash TEXT
                 );
                 """
             )
+            columns = {
+                r["name"]
+                for r in connect.execute("PRAGMA table_info(transactions)")
+            }
+            if "content_hash" not in columns:
+                connect.execute("ALTER TABLE transactions ADD COLUMN content_hash TEXT")
+
             connect.execute(
                 "CREATE INDEX IF NOT EXISTS idx_tx_date_time ON transactions(date, time);"
             )
+            # one hashed row per distinct content; repeat entries of the same
+            # content keep a NULL hash, which the unique index allows
+            connect.execute(
+                """
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_tx_content_hash
+                ON transactions(content_hash);
+                """
+            )
+            connect.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_tx_content_hash_handover
+                AFTER DELETE ON transactions
+                WHEN OLD.content_hash IS NOT NULL
+                BEGIN
+                    UPDATE transactions
+                    SET content_hash = OLD.content_hash
+                    WHERE id = (
+                        SELECT id FROM transactions
+                        WHERE content_hash IS NULL
+                          AND date = OLD.date
+                          AND time = OLD.time
+                          AND item = OLD.item
+                          AND amount = OLD.amount
+                          AND note = OLD.note
+                        LIMIT 1
+                    );
+                END;
+                """
+            )
+            # report queries read daily_totals by its primary key (see
+            # tests/test_query_plans.py), so the covering index an earlier
+            # version kept on live rows only slowed every write
+            connect.execute("DROP INDEX IF EXISTS idx_tx_live_date_amount")
+            self._create_daily_totals(connect)
+            self._create_change_log(connect)
+            self._create_search_index(connect)
+            self._create_item_stats(connect)
+
+            version = connect.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                # databases created before the rollup existed
+                self._rebuild_daily_totals(connect)
+            if version < 2:
+                self._backfill_content_hash(connect)
+            if version < 4:
+                self._rebuild_item_stats(connect)
+            if version < self.SCHEMA_VERSION:
+                connect.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
             connect.commit()
 
-    def add_transaction(self, date_str, time_str, item, amount, note):
-        created_at_ms = int(time.time() * 1000)
-        item = self._normalize_text(item)
-        note = self._normalize_text(note)
+    def _backfill_content_hash(self, connect):
+        # rows are visited in id order, so the oldest copy of repeated
+        # content takes the hash and later copies stay NULL
+        connect.create_function("tx_content_hash", 5, content_hash)
+        connect.execute(
+            """
+            UPDATE OR IGNORE transactions
+            SET content_hash = tx_content_hash(date, time, item, amount, note)
+            WHERE content_hash IS NULL
+            """
+        )
 
-        with self.connect() as connect:
-            current = connect.execute(
+    def _create_search_index(self, connect):
+        # full-text index over item and note. it is external content, so it
+        # keeps only the index and reads the text back from transactions.
+        # SQLite builds without FTS5 get no index and search() scans instead
+        names = {
+            r["name"]
+            for r in connect.execute(
+                """
+                SELECT name FROM sqlite_master
+                WHERE name IN ('transactions_fts', 'trg_tx_fts_insert')
                 """
-                INSERT INTO transactions
-                (date, time, item, amount, note, created_at_ms, deleted)
-                VALUES (?, ?, ?, ?, ?, ?, 0)
-                """,
-                (date_str, time_str, item, amount, note, created_at_ms),
             )
+        }
+        try:
+            connect.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts
+                USING fts5(
+                    item,
+                    note,
+                    content='transactions',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='2 3'
+                );
+                """
+            )
+        except sqlite3.OperationalError:
+            # a database indexed under another build: writes must not reach
+            # for a module this build lacks
+            for name in ("insert", "delete", "update"):
+                connect.execute(f"DROP TRIGGER IF EXISTS trg_tx_fts_{name}")
+            self._fts = False
+            return
+
+        connect.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_tx_fts_insert
+            AFTER INSERT ON transactions
+            BEGIN
+                INSERT INTO transactions_fts (rowid, item, note)
+                VALUES (NEW.id, NEW.item, NEW.note);
+            END;
+            """
+        )
+        connect.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_tx_fts_delete
+            AFTER DELETE ON transactions
+            BEGIN
+                INSERT INTO transactions_fts (transactions_fts, rowid, item, note)
+                VALUES ('delete', OLD.id, OLD.item, OLD.note);
+            END;
+            """
+        )
+        connect.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_tx_fts_update
+            AFTER UPDATE OF item, note ON transactions
+            BEGIN
+                INSERT INTO transactions_fts (transactions_fts, rowid, item, note)
+                VALUES ('delete', OLD.id, OLD.item, OLD.note);
+                INSERT INTO transactions_fts (rowid, item, note)
+                VALUES (NEW.id, NEW.item, NEW.note);
+            END;
+            """
+        )
+
+        # new index, or one that missed writes while its triggers were gone
+        if "trg_tx_fts_insert" not in names:
+            connect.execute(
+                "INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')"
+            )
+        self._fts = True
+
+    def _create_item_stats(self, connect):
+        # per-item usage for autocomplete, keyed by the item lowercased and
+        # kept by triggers like daily_totals. the spelling, amount and note
+        # are those of the newest live entry by date and time; deletes only
+        # lower the count
+        connect.execute(
+            """
+            CREATE TABLE IF NOT EXISTS item_stats (
+                key TEXT PRIMARY KEY,
+                item TEXT NOT NULL,
+                uses INTEGER NOT NULL DEFAULT 0,
+                last_seen TEXT NOT NULL DEFAULT '',
+                last_amount INTEGER NOT NULL DEFAULT 0,
+                last_note TEXT NOT NULL DEFAULT ''
+            ) WITHOUT ROWID;
+            """
+        )
+        connect.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_item_stats_insert
+            AFTER INSERT ON transactions
+            WHEN NEW.deleted = 0
+            BEGIN
+                INSERT OR IGNORE INTO item_stats (key, item)
+                VALUES (LOWER(NEW.item), NEW.item);
+                UPDATE item_stats
+                SET uses = uses + 1
+                WHERE key = LOWER(NEW.item);
+                UPDATE item_stats
+                SET item = NEW.item,
+                    last_seen = NEW.date || ' ' || NEW.time,
+                    last_amount = NEW.amount,
+                    last_note = NEW.note
+                WHERE key = LOWER(NEW.item)
+                  AND last_seen <= NEW.date || ' ' || NEW.time;
+            END;
+            """
+        )
+        connect.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_item_stats_delete
+            AFTER DELETE ON transactions
+            WHEN OLD.deleted = 0
+            BEGIN
+                UPDATE item_stats
+                SET uses = uses - 1
+                WHERE key = LOWER(OLD.item);
+                DELETE FROM item_stats WHERE key = LOWER(OLD.item) AND uses <= 0;
+            END;
+            """
+        )
+        connect.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_item_stats_update
+            AFTER UPDATE OF item, deleted ON transactions
+            BEGIN
+                UPDATE item_stats
+                SET uses = uses - 1
+                WHERE OLD.deleted = 0 AND key = LOWER(OLD.item);
+                DELETE FROM item_stats
+                WHERE OLD.deleted = 0 AND key = LOWER(OLD.item) AND uses <= 0;
+                INSERT OR IGNORE INTO item_stats (key, item)
+                SELECT LOWER(NEW.item), NEW.item WHERE NEW.deleted = 0;
+                UPDATE item_stats
+                SET uses = uses + 1
+                WHERE NEW.deleted = 0 AND key = LOWER(NEW.item);
+                UPDATE item_stats
+                SET item = NEW.item,
+                    last_seen = NEW.date || ' ' || NEW.time,
+                    last_amount = NEW.amount,
+                    last_note = NEW.note
+                WHERE NEW.deleted = 0
+                  AND key = LOWER(NEW.item)
+                  AND last_seen <= NEW.date || ' ' || NEW.time;
+            END;
+            """
+        )
+
+    def _rebuild_item_stats(self, connect):
+        # with a single MAX() aggregate SQLite takes the bare columns from
+        # the row holding the maximum, i.e. the newest entry of each item
+        connect.execute("DELETE FROM item_stats")
+        connect.execute(
+            """
+            INSERT INTO item_stats
+            (key, item, uses, last_seen, last_amount, last_note)
+            SELECT LOWER(item), item, COUNT(*), MAX(date || ' ' || time),
+                   amount, note
+            FROM transactions
+            WHERE deleted = 0
+            GROUP BY LOWER(item)
+            """
+        )
+
+    def _pause_derived_indexes(self, connect, adding):
+        # drops the search index and item_stats triggers for a bulk write
+        # big enough that one rebuild afterwards is cheaper; the drop is part
+        # of the writing transaction, so a rollback brings the triggers back
+        existing = connect.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        if adding * self.INDEX_REBUILD_RATIO < existing:
+            return False
+
+        for name in ("insert", "delete", "update"):
+            connect.execute(f"DROP TRIGGER IF EXISTS trg_tx_fts_{name}")
+            connect.execute(f"DROP TRIGGER IF EXISTS trg_item_stats_{name}")
+        return True
+
+    def _resume_derived_indexes(self, connect):
+        # the search index rebuilds itself when its triggers are missing
+        self._create_search_index(connect)
+        self._create_item_stats(connect)
+        self._rebuild_item_stats(connect)
+
+    def _create_daily_totals(self, connect):
+        # per-day rollup of live rows, kept in sync by triggers so every
+        # write path (including imports) updates it
+        connect.execute(
+            """
+            CREATE TABLE IF NOT EXISTS daily_totals (
+                date TEXT PRIMARY KEY,
+                total INTEGER NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID;
+            """
+        )
+        connect.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_daily_totals_insert
+            AFTER INSERT ON transactions
+            WHEN NEW.deleted = 0
+            BEGIN
+                INSERT OR IGNORE INTO daily_totals (date, total, count)
+                VALUES (NEW.date, 0, 0);
+                UPDATE daily_totals
+                SET total = total + NEW.amount, count = count + 1
+                WHERE date = NEW.date;
+            END;
+            """
+        )
+        connect.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_daily_totals_delete
+            AFTER DELETE ON transactions
+            WHEN OLD.deleted = 0
+            BEGIN
+                UPDATE daily_totals
+                SET total = total - OLD.amount, count = count - 1
+                WHERE date = OLD.date;
+                DELETE FROM daily_totals WHERE date = OLD.date AND count <= 0;
+            END;
+            """
+        )
+        connect.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_daily_totals_update
+            AFTER UPDATE OF date, amount, deleted ON transactions
+            BEGIN
+                UPDATE daily_totals
+                SET total = total - OLD.amount, count = count - 1
+                WHERE OLD.deleted = 0 AND date = OLD.date;
+                DELETE FROM daily_totals
+                WHERE OLD.deleted = 0 AND date = OLD.date AND count <= 0;
+                INSERT OR IGNORE INTO daily_totals (date, total, count)
+                SELECT NEW.date, 0, 0 WHERE NEW.deleted = 0;
+                UPDATE daily_totals
+                SET total = total + NEW.amount, count = count + 1
+                WHERE NEW.deleted = 0 AND date = NEW.date;
+            END;
+            """
+        )
+
+    def _create_change_log(self, connect):
+        # while logging is on every write appends the resulting state of the
+        # touched content to tx_changes; its AUTOINCREMENT seq is the change
+        # sequence that delta backups are keyed on. deleted is the content's
+        # state after the write: 0 live, 1 soft deleted, NULL no row left
+        connect.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tx_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT NOT NULL,
+                time TEXT NOT NULL,
+                item TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                note TEXT NOT NULL,
+                deleted INTEGER
+            );
+            """
+        )
+
+    def _create_change_log_triggers(self, connect):
+        connect.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_tx_changes_insert
+            AFTER INSERT ON transactions
+            BEGIN
+                {self._log_change_sql("NEW")};
+            END;
+            """
+        )
+        connect.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_tx_changes_delete
+            AFTER DELETE ON transactions
+            BEGIN
+                {self._log_change_sql("OLD")};
+            END;
+            """
+        )
+        connect.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_tx_changes_update
+            AFTER UPDATE OF date, time, item, amount, note, deleted
+            ON transactions
+            BEGIN
+                {self._log_change_sql("OLD")}
+                WHERE OLD.date IS NOT NEW.date
+                   OR OLD.time IS NOT NEW.time
+                   OR OLD.item IS NOT NEW.item
+                   OR OLD.amount IS NOT NEW.amount
+                   OR OLD.note IS NOT NEW.note;
+                {self._log_change_sql("NEW")};
+            END;
+            """
+        )
+
+    def _log_change_sql(self, ref):
+        # repeat entries of the same content share one state, the same way
+        # imports and restores collapse them
+        return f"""
+                INSERT INTO tx_changes
+                (date, time, item, amount, note, deleted)
+                SELECT {ref}.date, {ref}.time, {ref}.item, {ref}.amount,
+                       {ref}.note,
+                       (SELECT MIN(deleted) FROM transactions
+                        WHERE date = {ref}.date
+                          AND time = {ref}.time
+                          AND item = {ref}.item
+                          AND amount = {ref}.amount
+                          AND note = {ref}.note)"""
+
+    def _rebuild_daily_totals(self, connect):
+        connect.execute("DELETE FROM daily_totals")
+        connect.execute(
+            """
+            INSERT INTO daily_totals (date, total, count)
+            SELECT date, SUM(amount), COUNT(*)
+            FROM transactions
+            WHERE deleted = 0
+            GROUP BY date
+            """
+        )
+
+    def rebuild_daily_totals(self):
+        with self.connect() as connect:
+            self._rebuild_daily_totals(connect)
             connect.commit()
+        self._notify_change("rebuild")
+
+    def _insert_transaction(self, connect, row):
+        date_str, time_str, item, amount, note, created_at_ms = row
+        tx_hash = content_hash(date_str, time_str, item, amount, note)
+
+        current = connect.execute(
+            """
+            INSERT INTO transactions
+            (date, time, item, amount, note, created_at_ms, deleted,
+             content_hash)
+            SELECT ?, ?, ?, ?, ?, ?, 0,
+                   CASE WHEN EXISTS (
+                       SELECT 1 FROM transactions WHERE content_hash = ?
+                   ) THEN NULL ELSE ? END
+            """,
+            (
+                date_str,
+                time_str,
+                item,
+                amount,
+                note,
+                created_at_ms,
+                tx_hash,
+                tx_hash,
+            ),
+        )
         return current.lastrowid
 
+    def add_transaction(self, date_str, time_str, item, amount, note):
+        row = (
+            date_str,
+            time_str,
+            self._normalize_text(item),
+            amount,
+            self._normalize_text(note),
+            int(time.time() * 1000),
+        )
+
+        with self.connect() as connect:
+            txid = self._insert_transaction(connect, row)
+            connect.commit()
+        self._notify_change("add", [txid])
+        return txid
+
+    def enqueue_transaction(
+        self, date_str, time_str, item, amount, note, on_done=None
+    ):
+        # write-behind add: returns the optimistic row at once and commits it
+        # on the write-behind thread, then calls on_done(txid, error) there
+        if self._closed:
+            raise sqlite3.ProgrammingError("Database is closed")
+
+        row = (
+            date_str,
+            time_str,
+            self._normalize_text(item),
+            amount,
+            self._normalize_text(note),
+            int(time.time() * 1000),
+        )
+        self._write_queue.put(row, on_done)
+
+        return {
+            "id": None,
+            "date": row[0],
+            "time": row[1],
+            "item": row[2],
+            "amount": row[3],
+            "note": row[4],
+            "pending": True,
+        }
+
+    def pending_writes(self):
+        return self._write_queue.pending()
+
+    def flush_writes(self):
+        # blocks until every queued save is committed
+        self._write_queue.flush()
+
     def list_txns(self):
         with self.connect() as connect:
             rows = connect.execute(
@@ -62,6 +754,233 @@ class DataBase:
             ).fetchall()
             return [dict(r) for r in rows]
 
+    def search(self, query, limit=50, cursor=None):
+        # live rows where every word of `query` starts a word of the item or
+        # note, newest first. pages like list_txns_page: `cursor` is the
+        # (date, time, id) of the last row of the previous page
+        words = _SEARCH_WORD_RE.findall(query or "")
+        if not words:
+            return []
+
+        where, params = [], []
+        if cursor is not None:
+            where.append("AND (t.date, t.time, t.id) < (?, ?, ?)")
+            params.extend(cursor)
+        page = "\n".join(where)
+
+        with self.connect() as connect:
+            if self._fts is None:
+                self._fts = bool(
+                    connect.execute(
+                        "SELECT 1 FROM sqlite_master WHERE name = 'trg_tx_fts_insert'"
+                    ).fetchone()
+                )
+
+            if self._fts:
+                match = " ".join(f'"{word}"*' for word in words)
+                try:
+                    rows = connect.execute(
+                        f"""
+                        SELECT t.id, t.date, t.time, t.item, t.amount, t.note
+                        FROM transactions_fts f
+                        JOIN transactions t ON t.id = f.rowid
+                        WHERE transactions_fts MATCH ?
+                          AND t.deleted = 0
+                          {page}
+                        ORDER BY t.date DESC, t.time DESC, t.id DESC
+                        LIMIT ?
+                        """,
+                        (match, *params, limit),
+                    ).fetchall()
+                    return [dict(r) for r in rows]
+                except sqlite3.OperationalError:
+                    self._fts = False
+
+            # without the index: every word anywhere in item or note
+            terms, patterns = [], []
+            for word in words:
+                pattern = "%" + word.replace("_", "\\_") + "%"
+                terms.append(
+                    "AND (t.item LIKE ? ESCAPE '\\' OR t.note LIKE ? ESCAPE '\\')"
+                )
+                patterns.extend((pattern, pattern))
+            rows = connect.execute(
+                f"""
+                SELECT t.id, t.date, t.time, t.item, t.amount, t.note
+                FROM transactions t
+                WHERE t.deleted = 0
+                  {" ".join(terms)}
+                  {page}
+                ORDER BY t.date DESC, t.time DESC, t.id DESC
+                LIMIT ?
+                """,
+                (*patterns, *params, limit),
+            ).fetchall()
+            return [dict(r) for r in rows]
+
+    def item_suggestions(self, prefix, limit=50):
+        # item_stats rows whose lowercased item starts with `prefix`, which
+        # must be lowercased the same way (ASCII only, as SQLite LOWER does),
+        # most used first
+        with self.connect() as connect:
+            rows = connect.execute(
+                """
+                SELECT item, uses, last_seen, last_amount, last_note
+                FROM item_stats
+                WHERE key >= ? AND key < ?
+                ORDER BY uses DESC
+                LIMIT ?
+                """,
+                (prefix, prefix + "\U0010ffff", limit),
+            ).fetchall()
+            return [dict(r) for r in rows]
+
+    def get_txns(self, ids):
+        # live rows among `ids`, in no particular order
+        ids = list(ids)
+        if not ids:
+            return []
+
+        placeholders = ",".join("?" * len(ids))
+        with self.connect() as connect:
+            rows = connect.execute(
+                f"""
+                SELECT id, date, time, item, amount, note
+                FROM transactions
+                WHERE deleted = 0 AND id IN ({placeholders})
+                """,
+                ids,
+            ).fetchall()
+            return [dict(r) for r in rows]
+
+    @contextmanager
+    def read_snapshot(self):
+        # reads on this thread inside the block all see the same snapshot
+        connect = self.connect()
+        began = not connect.in_transaction
+        if began:
+            connect.execute("BEGIN")
+        try:
+            yield connect
+        finally:
+            if began:
+                connect.commit()
+
+    def count_txns(self):
+        row = self.connect().execute(
+            "SELECT COUNT(*) FROM transactions WHERE deleted = 0"
+        ).fetchone()
+        return int(row[0])
+
+    def iter_txns(self, batch_size=500):
+        # same rows and order as list_txns, fetched a batch at a time
+        cursor = self.connect().execute(
+            """
+            SELECT id, date, time, item, amount, note
+            FROM transactions
+            WHERE deleted = 0
+            ORDER BY date DESC, time DESC, id DESC
+            """
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for r in rows:
+                yield dict(r)
+
+    def change_seq(self):
+        # last change sequence handed out; survives pruning of the log
+        row = self.connect().execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'tx_changes'"
+        ).fetchone()
+        return int(row[0]) if row else 0
+
+    def _latest_changes_sql(self, columns):
+        return f"""
+            SELECT {columns} FROM tx_changes
+            WHERE seq IN (
+                SELECT MAX(seq) FROM tx_changes
+                WHERE seq > ? AND seq <= ?
+                GROUP BY date, time, item, amount, note
+            )
+        """
+
+    def count_changes(self, since_seq, until_seq):
+        row = self.connect().execute(
+            self._latest_changes_sql("COUNT(*)"), (since_seq, until_seq)
+        ).fetchone()
+        return int(row[0])
+
+    def iter_changes(self, since_seq, until_seq, batch_size=500):
+        # only the latest state of each content changed in (since, until]
+        cursor = self.connect().execute(
+            self._latest_changes_sql("date, time, item, amount, note, deleted")
+            + " ORDER BY seq",
+            (since_seq, until_seq),
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for r in rows:
+                change = dict(r)
+                deleted = change.pop("deleted")
+                if deleted is None:
+                    change["op"] = "delete"
+                else:
+                    change["op"] = "upsert"
+                    change["deleted"] = deleted
+                yield change
+
+    def set_change_log(self, enabled):
+        # the log only has a reader while a backup journal is linked; with
+        # logging off its triggers are dropped and its rows cleared, while
+        # sqlite_sequence keeps change_seq from going backwards
+        with self.connect() as connect:
+            if enabled:
+                self._create_change_log_triggers(connect)
+            else:
+                for name in ("insert", "delete", "update"):
+                    connect.execute(f"DROP TRIGGER IF EXISTS trg_tx_changes_{name}")
+                connect.execute("DELETE FROM tx_changes")
+            connect.commit()
+
+    def prune_changes(self, until_seq):
+        with self.connect() as connect:
+            connect.execute("DELETE FROM tx_changes WHERE seq <= ?", (until_seq,))
+            connect.commit()
+
+    def list_txns_page(self, before=None, limit=200):
+        # keyset pagination: `before` is the (date, time, id) of the last row
+        # of the previous page, so every page is one index range scan
+        with self.connect() as connect:
+            if before is None:
+                rows = connect.execute(
+                    """
+                    SELECT id, date, time, item, amount, note
+                    FROM transactions
+                    WHERE deleted = 0
+                    ORDER BY date DESC, time DESC, id DESC
+                    LIMIT ?
+                    """,
+                    (limit,),
+                ).fetchall()
+            else:
+                before_date, before_time, before_id = before
+                rows = connect.execute(
+                    """
+                    SELECT id, date, time, item, amount, note
+                    FROM transactions
+                    WHERE deleted = 0
+                      AND (date, time, id) < (?, ?, ?)
+                    ORDER BY date DESC, time DESC, id DESC
+                    LIMIT ?
+                    """,
+                    (before_date, before_time, before_id, limit),
+                ).fetchall()
+            return [dict(r) for r in rows]
+
     def soft_delete(self, txn_id):
         with self.connect() as connect:
             connect.execute(
@@ -69,11 +988,13 @@ class DataBase:
                 (txn_id,),
             )
             connect.commit()
+        self._notify_change("soft_delete", [txn_id])
 
     def hard_delete(self, txn_id: int):
         with self.connect() as connect:
             connect.execute("DELETE FROM transactions WHERE id = ?", (txn_id,))
             connect.commit()
+        self._notify_change("hard_delete", [txn_id])
 
     def undo_delete(self, txn_id):
         with self.connect() as connect:
@@ -82,50 +1003,61 @@ class DataBase:
                 (txn_id,),
             )
             connect.commit()
+        self._notify_change("undo_delete", [txn_id])
 
     def transaction_exists(self, date_str, time_str, item, amount, note):
         item = self._normalize_text(item)
         note = self._normalize_text(note)
 
+        tx_hash = content_hash(date_str, time_str, item, amount, note)
+
         with self.connect() as connect:
             row = connect.execute(
-                """
-                SELECT 1
-                FROM transactions
-                WHERE date = ?
-                  AND time = ?
-                  AND item = ?
-                  AND amount = ?
-                  AND note = ?
-                LIMIT 1
-                """,
-                (date_str, time_str, item, amount, note),
+                "SELECT 1 FROM transactions WHERE content_hash = ?",
+                (tx_hash,),
             ).fetchone()
             return row is not None
 
     def _normalize_text(self, value) -> str:
         return str(value or "").strip()
 
+    def _parse_date(self, value: str):
+        # same inputs strptime("%Y-%m-%d") accepted, returned zero-padded
+        match = _DATE_RE.match(value)
+        if match is None:
+            return None
+
+        year, month, day = (int(g) for g in match.groups())
+        if not 1 <= month <= 12 or day < 1:
+            return None
+        if day > 28 and day > calendar.monthrange(year, month)[1]:
+            return None
+
+        return f"{year:04d}-{month:02d}-{day:02d}"
+
+    def _parse_time(self, value: str):
+        match = _TIME_RE.match(value)
+        if match is None:
+            return None
+
+        hour, minute = (int(g) for g in match.groups())
+        if hour > 23 or minute > 59:
+            return None
+
+        return f"{hour:02d}:{minute:02d}"
+
     def _is_valid_date(self, value: str) -> bool:
-        try:
-            datetime.strptime(value, "%Y-%m-%d")
-            return True
-        except Exception:
-            return False
+        return self._parse_date(value) is not None
 
     def _is_valid_time(self, value: str) -> bool:
-        try:
-            datetime.strptime(value, "%H:%M")
-            return True
-        except Exception:
-            return False
+        return self._parse_time(value) is not None
 
     def _is_valid_import_row(self, tx: dict):
         if not isinstance(tx, dict):
             return False, None
 
-        date_str = self._normalize_text(tx.get("date", ""))
-        time_str = self._normalize_text(tx.get("time", ""))
+        date_str = self._parse_date(self._normalize_text(tx.get("date", "")))
+        time_str = self._parse_time(self._normalize_text(tx.get("time", "")))
         item = self._normalize_text(tx.get("item", ""))
         note = self._normalize_text(tx.get("note", ""))
 
@@ -137,104 +1069,289 @@ class DataBase:
 
         if not date_str or not time_str or not item or amount <= 0:
             return False, None
-
-        if not self._is_valid_date(date_str):
-            return False, None
-
-        if not self._is_valid_time(time_str):
+        if amount > self.MAX_AMOUNT:
             return False, None
 
-        return True, {
-            "date": date_str,
-            "time": time_str,
-            "item": item,
-            "amount": amount,
-            "note": note,
-        }
+        return True, (
+            date_str,
+            time_str,
+            item,
+            amount,
+            note,
+            content_hash(date_str, time_str, item, amount, note),
+        )
 
-    def import_transactions(self, transactions, skip_duplicates=True):
+    def import_transactions(
+        self, transactions, skip_duplicates=True, on_progress=None
+    ):
         imported_count = 0
         skipped_count = 0
 
         with self.connect() as connect:
-            existing_keys = set()
-
-            if skip_duplicates:
-                existing_rows = connect.execute(
-                    """
-                    SELECT date, time, item, amount, note
-                    FROM transactions
-                    """
-                ).fetchall()
-
-                for row in existing_rows:
-                    existing_keys.add(
-                        (
-                            row["date"],
-                            row["time"],
-                            row["item"],
-                            row["amount"],
-                            row["note"],
-                        )
-                    )
+            # the whole import is one transaction
+            if not connect.in_transaction:
+                connect.execute("BEGIN")
 
+            chunk = []
+            paused = False
             for tx in transactions:
-                valid, cleaned = self._is_valid_import_row(tx)
+                valid, row = self._is_valid_import_row(tx)
                 if not valid:
                     skipped_count += 1
                     continue
 
-                tx_key = (
-                    cleaned["date"],
-                    cleaned["time"],
-                    cleaned["item"],
-                    cleaned["amount"],
-                    cleaned["note"],
-                )
+                chunk.append(row)
+                if len(chunk) < self.IMPORT_CHUNK_SIZE:
+                    continue
+
+                if not paused:
+                    paused = self._pause_derived_indexes(
+                        connect, imported_count + len(chunk)
+                    )
+                inserted = self._insert_import_chunk(connect, chunk, skip_duplicates)
+                imported_count += inserted
+                skipped_count += len(chunk) - inserted
+                chunk = []
 
-                if skip_duplicates and tx_key in existing_keys:
+                if on_progress:
+                    on_progress(imported_count, skipped_count)
+
+            if chunk:
+                inserted = self._insert_import_chunk(connect, chunk, skip_duplicates)
+                imported_count += inserted
+                skipped_count += len(chunk) - inserted
+
+                if on_progress:
+                    on_progress(imported_count, skipped_count)
+
+            if paused:
+                self._resume_derived_indexes(connect)
+            connect.commit()
+
+        if imported_count:
+            self._notify_change("import")
+        return imported_count, skipped_count
+
+    def _insert_import_chunk(self, connect, chunk, skip_duplicates=True):
+        created_at_ms = int(time.time() * 1000)
+        if skip_duplicates:
+            # the unique content_hash index rejects duplicates, both against
+            # the database and within the import itself
+            sql = """
+                INSERT OR IGNORE INTO transactions
+                (date, time, item, amount, note, content_hash,
+                 created_at_ms, deleted)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+            """
+        else:
+            sql = """
+                INSERT INTO transactions
+                (date, time, item, amount, note, content_hash,
+                 created_at_ms, deleted)
+                SELECT ?1, ?2, ?3, ?4, ?5,
+                       CASE WHEN EXISTS (
+                           SELECT 1 FROM transactions WHERE content_hash = ?6
+                       ) THEN NULL ELSE ?6 END,
+                       ?7, 0
+            """
+
+        last_id = connect.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM transactions"
+        ).fetchone()[0]
+        last_seq = connect.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM tx_changes"
+        ).fetchone()[0]
+        try:
+            current = connect.executemany(
+                sql, (row + (created_at_ms,) for row in chunk)
+            )
+            return current.rowcount
+        except sqlite3.DatabaseError:
+            pass
+
+        # drop whatever part of the batch went in, then insert one by one so
+        # only the bad row is skipped
+        connect.execute("DELETE FROM transactions WHERE id > ?", (last_id,))
+        connect.execute("DELETE FROM tx_changes WHERE seq > ?", (last_seq,))
+        inserted = 0
+        for row in chunk:
+            try:
+                current = connect.execute(sql, row + (created_at_ms,))
+                inserted += current.rowcount
+            except sqlite3.DatabaseError:
+                pass
+        return inserted
+
+    def apply_changes(self, changes, on_progress=None):
+        # replays backup journal records in order: an upsert stores the
+        # content with its deleted state, a delete removes every row with
+        # that content. returns (applied, skipped)
+        applied_count = 0
+        skipped_count = 0
+
+        with self.connect() as connect:
+            if not connect.in_transaction:
+                connect.execute("BEGIN")
+
+            upserts = []
+            paused = False
+            for change in changes:
+                valid, row = self._is_valid_import_row(change)
+                op = change.get("op", "upsert") if valid else None
+                if op not in ("upsert", "delete"):
                     skipped_count += 1
                     continue
 
-                try:
-                    created_at_ms = int(time.time() * 1000)
+                if op == "upsert":
+                    upserts.append(row + (1 if change.get("deleted") else 0,))
+                    if len(upserts) < self.IMPORT_CHUNK_SIZE:
+                        continue
+
+                if not paused and upserts:
+                    paused = self._pause_derived_indexes(
+                        connect, applied_count + len(upserts)
+                    )
+                self._apply_upserts(connect, upserts)
+                applied_count += len(upserts)
+                upserts = []
 
+                if op == "delete":
                     connect.execute(
                         """
-                        INSERT INTO transactions
-                        (date, time, item, amount, note, created_at_ms, deleted)
-                        VALUES (?, ?, ?, ?, ?, ?, 0)
+                        DELETE FROM transactions
+                        WHERE date = ? AND time = ? AND item = ?
+                          AND amount = ? AND note = ?
                         """,
-                        (
-                            cleaned["date"],
-                            cleaned["time"],
-                            cleaned["item"],
-                            cleaned["amount"],
-                            cleaned["note"],
-                            created_at_ms,
-                        ),
+                        row[:5],
                     )
+                    applied_count += 1
 
-                    if skip_duplicates:
-                        existing_keys.add(tx_key)
+                if on_progress:
+                    on_progress(applied_count, skipped_count)
 
-                    imported_count += 1
+            if upserts:
+                self._apply_upserts(connect, upserts)
+                applied_count += len(upserts)
 
-                except Exception:
-                    skipped_count += 1
+                if on_progress:
+                    on_progress(applied_count, skipped_count)
 
+            if paused:
+                self._resume_derived_indexes(connect)
             connect.commit()
 
-        return imported_count, skipped_count
+        if applied_count:
+            self._notify_change("import")
+        return applied_count, skipped_count
+
+    def _apply_upserts(self, connect, rows):
+        if not rows:
+            return
+
+        created_at_ms = int(time.time() * 1000)
+        connect.executemany(
+            """
+            INSERT OR IGNORE INTO transactions
+            (date, time, item, amount, note, content_hash, created_at_ms, deleted)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (row[:6] + (created_at_ms, row[6]) for row in rows),
+        )
+        # content that was already present only takes the new state
+        connect.executemany(
+            """
+            UPDATE transactions SET deleted = ?6
+            WHERE date = ?1 AND time = ?2 AND item = ?3
+              AND amount = ?4 AND note = ?5 AND deleted != ?6
+            """,
+            (row[:5] + (row[6],) for row in rows),
+        )
+
+    def snapshot_to(self, path, compact=False):
+        # consistent binary copy of the database as one self-contained file;
+        # compact rebuilds it with VACUUM INTO so free pages are left behind
+        if os.path.exists(path):
+            os.remove(path)
+
+        connect = self.connect()
+        if compact and sqlite3.sqlite_version_info >= (3, 27, 0):
+            connect.execute("VACUUM INTO ?", (path,))
+        else:
+            target = sqlite3.connect(path)
+            try:
+                connect.backup(target)
+            finally:
+                target.close()
+
+        # the copy must not depend on a -wal file next to it
+        target = sqlite3.connect(path)
+        try:
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+
+    def merge_snapshot(self, path):
+        # merges the transactions of a snapshot_to file with set-based SQL,
+        # keeping created_at_ms and deleted; returns (imported, skipped)
+        connect = self.connect()
+        if connect.in_transaction:
+            connect.commit()
+
+        connect.execute("ATTACH DATABASE ? AS snap", (path,))
+        try:
+            if connect.execute("PRAGMA snap.quick_check").fetchone()[0] != "ok":
+                raise sqlite3.DatabaseError("Snapshot is corrupted")
+
+            columns = {
+                r["name"]
+                for r in connect.execute("PRAGMA snap.table_info(transactions)")
+            }
+            needed = {"date", "time", "item", "amount", "note", "created_at_ms"}
+            if not needed <= columns:
+                raise sqlite3.DatabaseError("Not a TxTracker snapshot")
+            deleted = "deleted" if "deleted" in columns else "0"
+
+            connect.create_function("tx_content_hash", 5, content_hash)
+            with connect:
+                # explicit, so the trigger drops below roll back with the merge
+                connect.execute("BEGIN")
+                total = connect.execute(
+                    "SELECT COUNT(*) FROM snap.transactions"
+                ).fetchone()[0]
+                paused = self._pause_derived_indexes(connect, total)
+                # oldest copy of repeated content wins, as in the backfill
+                imported = connect.execute(
+                    f"""
+                    INSERT OR IGNORE INTO main.transactions
+                    (date, time, item, amount, note, content_hash,
+                     created_at_ms, deleted)
+                    SELECT date, time, item, amount, note,
+                           tx_content_hash(date, time, item, amount, note),
+                           created_at_ms, {deleted}
+                    FROM snap.transactions
+                    WHERE date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+                      AND time GLOB '[0-9][0-9]:[0-9][0-9]'
+                      AND item != ''
+                      AND amount > 0
+                    ORDER BY id
+                    """
+                ).rowcount
+                if paused:
+                    self._resume_derived_indexes(connect)
+        finally:
+            connect.execute("DETACH DATABASE snap")
+
+        if imported:
+            self._notify_change("import")
+        return imported, total - imported
 
     def sum_between_dates(self, start_date, end_date):
         with self.connect() as connect:
             row = connect.execute(
                 """
-                SELECT COALESCE(SUM(amount), 0)
-                FROM transactions
-                WHERE deleted = 0
-                  AND date >= ?
+                SELECT COALESCE(SUM(total), 0)
+                FROM daily_totals
+                WHERE date >= ?
                   AND date < ?
                 """,
                 (start_date, end_date),
@@ -248,12 +1365,10 @@ class DataBase:
         with self.connect() as connect:
             rows = connect.execute(
                 """
-                SELECT date, COALESCE(SUM(amount), 0) AS total
-                FROM transactions
-                WHERE deleted = 0
-                  AND date >= ?
+                SELECT date, total
+                FROM daily_totals
+                WHERE date >= ?
                   AND date < ?
-                GROUP BY date
                 """,
                 (start_str, end_str),
             ).fetchall()
@@ -280,12 +1395,10 @@ class DataBase:
         with self.connect() as connect:
             rows = connect.execute(
                 """
-                SELECT date, COALESCE(SUM(amount), 0) AS total
-                FROM transactions
-                WHERE deleted = 0
-                  AND date >= ?
+                SELECT date, total
+                FROM daily_totals
+                WHERE date >= ?
                   AND date < ?
-                GROUP BY date
                 """,
                 (start_str, end_str),
             ).fetchall()
@@ -309,10 +1422,9 @@ class DataBase:
         with self.connect() as connect:
             rows = connect.execute(
                 """
-                SELECT SUBSTR(date, 1, 7) AS month, COALESCE(SUM(amount), 0) AS total
-                FROM transactions
-                WHERE deleted = 0
-                  AND date >= ?
+                SELECT SUBSTR(date, 1, 7) AS month, COALESCE(SUM(total), 0) AS total
+                FROM daily_totals
+                WHERE date >= ?
                   AND date < ?
                 GROUP BY month
                 """,
@@ -325,3 +1437,75 @@ class DataBase:
             month_str = f"{year}-{month:02d}"
             out.append(totals_by_month.get(month_str, 0))
         return out
+
+    def month_counts(self):
+        # live transactions per "YYYY-MM", newest month first
+        with self.connect() as connect:
+            rows = connect.execute(
+                """
+                SELECT SUBSTR(date, 1, 7) AS month, SUM(count) AS count
+                FROM daily_totals
+                GROUP BY month
+                ORDER BY month DESC
+                """
+            ).fetchall()
+        return [(r["month"], int(r["count"])) for r in rows]
+
+    def report_bundle(self, today: date):
+        week_start = start_of_week_sun(today)
+        week_end = week_start + timedelta(days=7)
+        month_start = start_of_month(today)
+        if month_start.month == 12:
+            next_month_start = date(month_start.year + 1, 1, 1)
+        else:
+            next_month_start = date(month_start.year, month_start.month + 1, 1)
+        year_start = start_of_year(today)
+        next_year_start = date(today.year + 1, 1, 1)
+
+        # the week can start in December of the previous year or run into
+        # January of the next one, so cover both ends in the same read
+        range_start = min(week_start, year_start).strftime("%Y-%m-%d")
+        range_end = max(week_end, next_year_start).strftime("%Y-%m-%d")
+
+        with self.connect() as connect:
+            rows = connect.execute(
+                """
+                SELECT date, total
+                FROM daily_totals
+                WHERE date >= ?
+                  AND date < ?
+                """,
+                (range_start, range_end),
+            ).fetchall()
+
+        totals_by_date = {r["date"]: int(r["total"]) for r in rows}
+        end_exclusive = (today + timedelta(days=1)).strftime("%Y-%m-%d")
+
+        def total_since(start: date):
+            start_str = start.strftime("%Y-%m-%d")
+            return sum(
+                v for d, v in totals_by_date.items() if start_str <= d < end_exclusive
+            )
+
+        def daily_series(start: date, end: date):
+            out = []
+            current_date = start
+            while current_date < end:
+                out.append(totals_by_date.get(current_date.strftime("%Y-%m-%d"), 0))
+                current_date += timedelta(days=1)
+            return out
+
+        year_prefix = f"{today.year}-"
+        monthly = [0] * 12
+        for d, v in totals_by_date.items():
+            if d.startswith(year_prefix):
+                monthly[int(d[5:7]) - 1] += v
+
+        return {
+            "week_total": total_since(week_start),
+            "month_total": total_since(month_start),
+            "year_total": total_since(year_start),
+            "week_daily": daily_series(week_start, week_end),
+            "month_daily": daily_series(month_start, next_month_start),
+            "year_monthly": monthly,
+        }
@@ -1,3 +1,4 @@
+import math
 from kivy.app import App
 from kivy.metrics import dp
 from kivy.clock import Clock
@@ -10,7 +11,29 @@ from kivymd.uix.label import MDLabel
 from kivymd.uix.button import MDIconButton
 from kivymd.uix.textfield import MDTextField
 from kivymd.uix.pickers import MDDatePicker, MDTimePicker
-from app.utils import rupees_to_paise, time_24_to_12
+from app.services.item_suggest import ItemSuggestions
+from app.utils import paise_to_rupees, rupees_to_paise, time_24_to_12
+
+# advance width of every character measured so far at _GLYPH_REF_SIZE, per
+# font name; widths at other sizes are scaled from these, so fitting the
+# amount never renders a texture
+_GLYPH_REF_SIZE = 100
+_glyph_widths = {}
+
+
+def _text_width(text, font_name, font_size):
+    widths = _glyph_widths.get(font_name)
+    if widths is None:
+        widths = _glyph_widths[font_name] = {}
+
+    total = 0
+    for ch in text:
+        w = widths.get(ch)
+        if w is None:
+            label = CoreLabel(font_name=font_name, font_size=_GLYPH_REF_SIZE)
+            w = widths[ch] = label.get_extents(ch)[0]
+        total += w
+    return total * font_size / _GLYPH_REF_SIZE
 
 
 class AddScreen(BoxLayout):
@@ -31,6 +54,12 @@ class AddScreen(BoxLayout):
         self._status_reset_event = None
         self._accent_rgba = (0.914, 0.094, 0.153, 1.0)
         self._amount_font_bias = 0
+        self._card_base_height = dp(400)
+
+        # past items, offered as chips while the item is typed
+        self.suggestions = ItemSuggestions(db)
+        self._suggested = []
+        self._picked_item = None
 
         self.main_card = MDCard(
             orientation="vertical",
@@ -53,6 +82,35 @@ class AddScreen(BoxLayout):
 
         self.item_input = MDTextField(hint_text="Item*")
         self.item_input.font_name_hint_text = "Nunito-Medium"
+        self.item_input.bind(text=self._on_item_text)
+
+        self.suggestion_row = BoxLayout(
+            orientation="horizontal",
+            size_hint_y=None,
+            height=0,
+            spacing=dp(6),
+            opacity=0,
+        )
+        self.suggestion_chips = []
+        for i in range(3):
+            chip = MDCard(
+                size_hint=(1, None),
+                height=dp(30),
+                radius=[dp(15)],
+                padding=(dp(10), 0, dp(10), 0),
+                md_bg_color=(0.05, 0.06, 0.07, 0.85),
+                elevation=0,
+            )
+            chip_label = MDLabel(text="", halign="center", valign="middle")
+            chip_label.font_name = "Nunito-SemiBold"
+            chip_label.font_size = "13sp"
+            chip_label.shorten = True
+            chip_label.shorten_from = "right"
+            chip_label.bind(size=lambda w, *_: setattr(w, "text_size", w.size))
+            chip.add_widget(chip_label)
+            chip.bind(on_release=lambda *_, i=i: self._pick_suggestion(i))
+            self.suggestion_row.add_widget(chip)
+            self.suggestion_chips.append((chip, chip_label))
 
         hero_wrap = AnchorLayout(size_hint_y=None, height=dp(72))
         hero_wrap.padding = (0, 0, 0, dp(28))
@@ -275,6 +333,7 @@ class AddScreen(BoxLayout):
 
         self.main_card.add_widget(self.item_name_label)
         self.main_card.add_widget(pill_row(self.item_input, "tag-outline"))
+        self.main_card.add_widget(self.suggestion_row)
 
         self.main_card.add_widget(self.details_label)
         self.main_card.add_widget(pill_row(self.note_input, "pencil-outline"))
@@ -370,7 +429,8 @@ class AddScreen(BoxLayout):
 
         self.main_card.md_bg_color = (0.08, 0.09, 0.11, alpha)
         self.main_card.radius = [radius]
-        self.main_card.height = dp(382) if compact else dp(400)
+        self._card_base_height = dp(382) if compact else dp(400)
+        self.main_card.height = self._card_base_height + self.suggestion_row.height
         self.main_card.padding = (
             (dp(16), dp(16), dp(16), dp(16))
             if compact
@@ -458,15 +518,12 @@ class AddScreen(BoxLayout):
             self.set_status("Invalid amount")
             return
 
-        self.db.add_transaction(date_str, time_str, item, amount, note)
+        # the save is committed behind the UI; the form is free again at once
+        self.db.enqueue_transaction(
+            date_str, time_str, item, amount, note, on_done=self._on_save_committed
+        )
         self.set_status("Saved")
 
-        app = App.get_running_app()
-        if app and hasattr(app, "refresh_history"):
-            app.refresh_history()
-        if app and hasattr(app, "refresh_reports"):
-            app.refresh_reports()
-
         keep_datetime = self._get_pref("keep_datetime_after_save", "on") == "on"
         keep_note = (
             self._get_pref(
@@ -496,6 +553,66 @@ class AddScreen(BoxLayout):
         self.amount_input.focus = False
         self.item_input.focus = reopen_keyboard
 
+    def _on_save_committed(self, txid, error):
+        # runs on the write-behind thread
+        Clock.schedule_once(lambda *_: self._after_save_committed(error), 0)
+
+    def _after_save_committed(self, error):
+        # the other screens hear about the new row from the change bus
+        if error is not None:
+            self.set_status(f"Save failed: {error}")
+
+    def _on_item_text(self, instance, value: str):
+        if value == self._picked_item:
+            self._show_suggestions([])
+            return
+
+        self._picked_item = None
+        try:
+            found = self.suggestions.suggest(value, limit=len(self.suggestion_chips))
+        except Exception:
+            found = []
+
+        # nothing left to complete once the only match is typed out
+        if len(found) == 1 and found[0]["item"] == value.strip():
+            found = []
+        self._show_suggestions(found)
+
+    def _show_suggestions(self, found):
+        self._suggested = found
+        for i, (chip, chip_label) in enumerate(self.suggestion_chips):
+            if i < len(found):
+                amount = self._amount_text(found[i]["last_amount"])
+                chip_label.text = f"{found[i]['item']}  ₹{amount}"
+                chip.opacity = 1
+                chip.disabled = False
+            else:
+                chip_label.text = ""
+                chip.opacity = 0
+                chip.disabled = True
+
+        self.suggestion_row.height = dp(34) if found else 0
+        self.suggestion_row.opacity = 1 if found else 0
+        self.main_card.height = self._card_base_height + self.suggestion_row.height
+
+    def _amount_text(self, paise):
+        amount = paise_to_rupees(paise)
+        return amount[:-3] if amount.endswith(".00") else amount
+
+    def _pick_suggestion(self, index):
+        if index >= len(self._suggested):
+            return
+
+        picked = self._suggested[index]
+        self._picked_item = picked["item"]
+        self.item_input.text = picked["item"]
+
+        # the last amount and note fill in only what is still empty
+        if not self.amount_input.text.strip():
+            self.amount_input.text = self._amount_text(picked["last_amount"])
+        if not self.note_input.text.strip() and picked["last_note"]:
+            self.note_input.text = picked["last_note"]
+
     def _format_inr_display(self, raw: str) -> str:
         if not raw:
             return "0"
@@ -579,22 +696,22 @@ class AddScreen(BoxLayout):
         min_fs = dp(34) + min(0, self._amount_font_bias)
 
         text = self.hero_amount.text if self.hero_amount.text else "0"
-
-        fs = default_fs
-        while fs > min_fs:
-            lbl = CoreLabel(text=text, font_size=fs)
-            lbl.refresh()
-            w = lbl.texture.size[0]
-
-            if w <= avail_digits_w:
-                break
-            fs -= dp(2)
+        font_name = self.hero_amount.font_name
+
+        # the largest size, in dp(2) steps down from the default, that fits;
+        # past min_fs the last step is used whether it fits or not
+        step = dp(2)
+        lo, hi = 0, max(0, math.ceil((default_fs - min_fs) / step))
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _text_width(text, font_name, default_fs - mid * step) <= avail_digits_w:
+                hi = mid
+            else:
+                lo = mid + 1
+        fs = default_fs - lo * step
 
         self.hero_amount.font_size = fs
-
-        lbl = CoreLabel(text=text, font_size=fs)
-        lbl.refresh()
-        digits_w = min(lbl.texture.size[0], avail_digits_w)
+        digits_w = min(_text_width(text, font_name, fs), avail_digits_w)
 
         self.hero_amount.size_hint = (None, None)
         self.hero_amount.width = digits_w
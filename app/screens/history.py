@@ -1,7 +1,12 @@
+import threading
+from bisect import bisect_left, bisect_right
 from datetime import date, timedelta
-from kivy.app import App
+from functools import lru_cache
+from kivy.clock import Clock
+from kivy.graphics import Color, RoundedRectangle
 from kivy.metrics import dp
 from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.widget import Widget
 from kivy.uix.recycleview import RecycleView
 from kivy.uix.stencilview import StencilView
 from kivy.uix.recycleboxlayout import RecycleBoxLayout
@@ -10,14 +15,29 @@ from kivymd.uix.card import MDCard
 from kivymd.uix.label import MDLabel
 from kivymd.uix.button import MDIconButton, MDFlatButton
 from kivymd.uix.dialog import MDDialog
+from kivymd.uix.textfield import MDTextField
 from app.utils import (
     paise_to_rupees,
     time_24_to_12,
-    str_to_date,
     start_of_week_sun,
     start_of_month,
 )
 
+# maps every digit to 9 - digit, so ascending order of the mapped text is
+# descending order of the ISO date or time it came from
+_DESC_DIGITS = str.maketrans("0123456789", "9876543210")
+
+
+@lru_cache(maxsize=8192)
+def _desc(text):
+    return text.translate(_DESC_DIGITS)
+
+
+@lru_cache(maxsize=512)
+def _month_label(month):
+    year, number = month.split("-")
+    return date(int(year), int(number), 1).strftime("%B %Y")
+
 
 class HistoryRow(RecycleDataViewBehavior, BoxLayout):
     def __init__(self, **kwargs):
@@ -230,6 +250,217 @@ class HistoryRow(RecycleDataViewBehavior, BoxLayout):
         return super().on_touch_up(touch)
 
 
+class _HistoryRows:
+    # what rv.data was built from: the sort key of every row, ascending in
+    # display order so a row's position is one bisect away, and the row
+    # counts that decide when headers come and go. a refresh builds a new
+    # one off the UI thread; patches and later pages update it in place
+    def __init__(self, today, query=""):
+        month_start = start_of_month(today)
+        week_start = start_of_week_sun(today)
+
+        self.today = today
+
+        # search text the rows match; empty for the full history
+        self.query = query
+
+        # rows are bucketed by comparing their ISO date text with these
+        self.today_str = today.isoformat()
+        self.yesterday_str = (today - timedelta(days=1)).isoformat()
+        self.week_start_str = week_start.isoformat()
+        self.month_start_str = month_start.isoformat()
+
+        # a section header sorts just before the newest date it can hold
+        one_day = timedelta(days=1)
+        self.section_keys = {
+            "This Week": ("",),
+            "This Month": (_desc((week_start - one_day).isoformat()),),
+            "Older": (_desc((min(week_start, month_start) - one_day).isoformat()),),
+        }
+
+        self.keys = []
+        self.tx_keys = {}
+        self.group_sizes = {}
+        self.section_sizes = {}
+        self.page_cursor = None
+        self.cursor_key = None
+        self.has_more = True
+        self.empty = False
+
+        # (month, count) over the whole history, newest first, with running
+        # totals; None until fetched
+        self.months = None
+        self.month_ends = []
+
+        # scroll index, see index(); None whenever the rows change
+        self.layout = None
+
+    def set_months(self, months):
+        self.months = months
+        self.month_ends = []
+        total = 0
+        for _, count in months:
+            total += count
+            self.month_ends.append(total)
+
+    def index(self):
+        # y offset of each loaded month's first date group from the top of
+        # the list, added up per date group from the fixed row heights
+        # rather than laid out. returns (tops by month, ascending tops, their
+        # months, content height)
+        if self.layout is None:
+            tx_h, group_h, section_h, gap = dp(96), dp(16), dp(26), dp(6)
+            tops, top_list, month_list = {}, [], []
+            section = None
+            y = 0
+            for date_str in sorted(self.group_sizes, reverse=True):
+                date_section, _ = self.bucket(date_str)
+                if date_section != section:
+                    section = date_section
+                    y += section_h + gap
+
+                month = date_str[:7]
+                if month not in tops:
+                    tops[month] = y
+                    top_list.append(y)
+                    month_list.append(month)
+
+                y += group_h + gap + self.group_sizes[date_str] * (tx_h + gap)
+
+            self.layout = (tops, top_list, month_list, max(0, y - gap))
+        return self.layout
+
+    def bucket(self, date_str):
+        if date_str >= self.week_start_str:
+            if date_str == self.today_str:
+                return "This Week", "Today"
+            if date_str == self.yesterday_str:
+                return "This Week", "Yesterday"
+            return "This Week", date_str
+        if date_str >= self.month_start_str:
+            return "This Month", date_str
+        return "Older", date_str
+
+
+class _HistoryBuilder:
+    # one long-lived thread, so its database connection is reused between
+    # refreshes; only the newest request is built, older ones never start
+    def __init__(self, db, build):
+        self._db = db
+        self._build = build
+        self._request = None
+        self._stopping = False
+        self._wake = threading.Condition()
+        self._thread = None
+
+    def request(self, *args):
+        with self._wake:
+            self._request = args
+            self._wake.notify()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._loop, name="history-builder", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        with self._wake:
+            self._stopping = True
+            self._wake.notify()
+            thread = self._thread
+            self._thread = None
+
+        if thread is not None:
+            thread.join(timeout=2)
+
+    def _loop(self):
+        try:
+            while True:
+                with self._wake:
+                    while self._request is None and not self._stopping:
+                        self._wake.wait()
+                    if self._stopping:
+                        return
+                    request, self._request = self._request, None
+
+                try:
+                    self._build(*request)
+                except Exception:
+                    pass
+        finally:
+            self._db.release()
+
+
+class FastScrollRail(Widget):
+    # thin rail along the right edge of the list. its thumb tracks the
+    # position in the whole history, and dragging it reports the fraction
+    # of the way down (0 top, 1 bottom) to on_drag(fraction, released)
+    def __init__(self, on_drag, **kwargs):
+        super().__init__(**kwargs)
+        self.size_hint = (None, None)
+        self.width = dp(24)
+        self.fraction = 0.0
+        self.dragging = False
+        self._on_drag = on_drag
+
+        with self.canvas:
+            Color(1, 1, 1, 0.08)
+            self._track = RoundedRectangle(radius=[dp(2)])
+            self._thumb_color = Color(1, 1, 1, 0.35)
+            self._thumb = RoundedRectangle(radius=[dp(3)])
+
+        self.bind(pos=self._redraw, size=self._redraw)
+
+    def set_fraction(self, fraction):
+        self.fraction = max(0.0, min(1.0, fraction))
+        self._redraw()
+
+    def _redraw(self, *_):
+        track_w = dp(4)
+        thumb_w = dp(6)
+        thumb_h = dp(40)
+        self._track.pos = (self.right - dp(9), self.y)
+        self._track.size = (track_w, self.height)
+
+        travel = max(0, self.height - thumb_h)
+        self._thumb.pos = (
+            self.right - dp(10),
+            self.top - thumb_h - travel * self.fraction,
+        )
+        self._thumb.size = (thumb_w, thumb_h)
+
+    def _drag(self, touch, released):
+        if self.height <= 0:
+            return
+        self.set_fraction((self.top - touch.y) / self.height)
+        self._on_drag(self.fraction, released)
+
+    def on_touch_down(self, touch):
+        if self.disabled or not self.collide_point(*touch.pos):
+            return super().on_touch_down(touch)
+
+        touch.grab(self)
+        self.dragging = True
+        self._thumb_color.a = 0.85
+        self._drag(touch, False)
+        return True
+
+    def on_touch_move(self, touch):
+        if touch.grab_current is self:
+            self._drag(touch, False)
+            return True
+        return super().on_touch_move(touch)
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is self:
+            touch.ungrab(self)
+            self.dragging = False
+            self._thumb_color.a = 0.35
+            self._drag(touch, True)
+            return True
+        return super().on_touch_up(touch)
+
+
 class HistoryScreen(BoxLayout):
     def __init__(self, db, **kwargs):
         super().__init__(**kwargs)
@@ -241,9 +472,78 @@ class HistoryScreen(BoxLayout):
         self.last_deleted_id = None
         self._note_dialog = None
 
+        self.page_size = 200
+        self._rows = _HistoryRows(date.today())
+        self._rows.has_more = False
+
+        # rebuilt lazily: changes only mark the list dirty until it is shown
+        self.active = False
+        self._dirty = True
+
+        # refreshes build on a worker thread; changes arriving meanwhile are
+        # held and patched into the new rows once they are swapped in
+        self._build_gen = 0
+        self._building = False
+        self._held_events = []
+        self._builder = _HistoryBuilder(db, self._build_rows)
+        self._jump_month = None
+
+        # typing settles for a moment before the list is rebuilt for it
+        self._query = ""
+        self._search_trigger = Clock.create_trigger(self._apply_search, 0.25)
+
+        self.search_input = MDTextField(
+            hint_text="Search item or note",
+            multiline=False,
+            size_hint_y=None,
+        )
+        self.search_input.font_name_hint_text = "Nunito-Medium"
+        self.search_input.bind(text=lambda *_: self._search_trigger())
+        self.add_widget(self.search_input)
+
+        month_bar = BoxLayout(
+            orientation="horizontal",
+            size_hint_y=None,
+            height=dp(36),
+            spacing=dp(4),
+        )
+
+        self.month_label = MDLabel(text="", halign="left", valign="middle")
+        self.month_label.font_name = "Nunito-ExtraBold"
+        self.month_label.font_size = "15sp"
+
+        newer_button = MDIconButton(icon="chevron-up")
+        newer_button.bind(on_release=lambda *_: self.step_month(-1))
+        older_button = MDIconButton(icon="chevron-down")
+        older_button.bind(on_release=lambda *_: self.step_month(1))
+
+        month_bar.add_widget(self.month_label)
+        month_bar.add_widget(newer_button)
+        month_bar.add_widget(older_button)
+        self.add_widget(month_bar)
+
         rv_wrap = StencilView(size_hint=(1, 1))
         self.rv = RecycleView(size_hint=(None, None))
         rv_wrap.add_widget(self.rv)
+
+        self.rail = FastScrollRail(on_drag=self._on_rail_drag)
+        rv_wrap.add_widget(self.rail)
+
+        self.rail_bubble = MDCard(
+            size_hint=(None, None),
+            size=(dp(140), dp(36)),
+            radius=[dp(12)],
+            padding=(dp(12), 0, dp(12), 0),
+            md_bg_color=(0.05, 0.06, 0.07, 0.95),
+            elevation=0,
+        )
+        self.rail_bubble_label = MDLabel(text="", halign="center", valign="middle")
+        self.rail_bubble_label.font_name = "Nunito-ExtraBold"
+        self.rail_bubble_label.font_size = "14sp"
+        self.rail_bubble.add_widget(self.rail_bubble_label)
+        self.rail_bubble.opacity = 0
+        rv_wrap.add_widget(self.rail_bubble)
+
         self.add_widget(rv_wrap)
         rv_wrap.bind(pos=self._sync_rv_clip, size=self._sync_rv_clip)
 
@@ -259,6 +559,7 @@ class HistoryScreen(BoxLayout):
         self.rv.layout_manager = self.rv_layout
         self.rv.add_widget(self.rv_layout)
         self.rv.viewclass = HistoryRow
+        self.rv.bind(scroll_y=self._on_rv_scroll)
 
         self.undo_bar = MDCard(
             orientation="horizontal",
@@ -296,6 +597,8 @@ class HistoryScreen(BoxLayout):
         if self.rv:
             self.rv.pos = args[0].pos
             self.rv.size = args[0].size
+            self.rail.height = args[0].height
+            self.rail.pos = (args[0].right - self.rail.width, args[0].y)
 
     def _build_tx_data(self, t: dict):
         amount = paise_to_rupees(t["amount"])
@@ -332,97 +635,378 @@ class HistoryScreen(BoxLayout):
             "size_hint_y": None,
         }
 
-    def refresh(self):
-        self.rv.data = []
-        transactions = self.db.list_txns()
+    def _empty_row(self, query=""):
+        return self._section_row("No matches" if query else "No transactions yet")
 
-        if not transactions:
-            self.rv.data = [
-                {
-                    "kind": "section",
-                    "text": "No transactions yet",
-                    "height": dp(26),
-                    "size_hint_y": None,
-                }
-            ]
+    def set_active(self, active):
+        self.active = active
+        if active and (self._dirty or self._rows.today != date.today()):
+            self.refresh()
+
+    def on_db_changes(self, events):
+        # single-row changes are patched into the built list in place;
+        # bulk changes, or changes to a list that is stale anyway, rebuild
+        if self._building:
+            self._held_events.extend(events)
             return
 
-        today = date.today()
-        yesterday = today - timedelta(days=1)
+        self._rows.months = None
+        for kind, ids in events:
+            if kind == "rebuild" or self._dirty:
+                continue
+
+            if ids is None:
+                self._dirty = True
+            elif kind in ("add", "undo_delete"):
+                # search results are re-run rather than matched here
+                if self._rows.query:
+                    self._dirty = True
+                    continue
+                for t in self.db.get_txns(ids):
+                    self._insert_tx_row(t)
+            elif kind in ("soft_delete", "hard_delete"):
+                for txid in ids:
+                    self._remove_tx_row(txid)
+
+        if self._dirty and self.active:
+            self.refresh()
+
+    def _tx_key(self, t):
+        return (_desc(t["date"]), _desc(t["time"]), -t["id"])
+
+    def _insert_tx_row(self, t):
+        rows = self._rows
+        if t["id"] in rows.tx_keys:
+            return
 
-        week_start = start_of_week_sun(today)
-        week_end = week_start + timedelta(days=7)
+        key = self._tx_key(t)
+
+        # rows past the last loaded page arrive with the next page
+        if rows.has_more and rows.cursor_key is not None:
+            if key > rows.cursor_key:
+                return
+
+        if rows.empty:
+            rows.empty = False
+            self.rv.data = []
+
+        section, group = rows.bucket(t["date"])
+        new_rows = []
+        keys = []
+        if not rows.section_sizes.get(section):
+            new_rows.append(self._section_row(section))
+            keys.append(rows.section_keys[section])
+        if not rows.group_sizes.get(t["date"]):
+            new_rows.append(self._group_row(group))
+            keys.append((_desc(t["date"]), ""))
+        new_rows.append(self._build_tx_data(t))
+        keys.append(key)
+
+        index = bisect_left(rows.keys, key)
+        rows.keys[index:index] = keys
+        self.rv.data[index:index] = new_rows
+
+        rows.tx_keys[t["id"]] = key
+        rows.section_sizes[section] = rows.section_sizes.get(section, 0) + 1
+        rows.group_sizes[t["date"]] = rows.group_sizes.get(t["date"], 0) + 1
+        rows.layout = None
+
+    def _remove_tx_row(self, txid):
+        rows = self._rows
+        key = rows.tx_keys.pop(txid, None)
+        if key is None:
+            return
 
-        month_start = start_of_month(today)
-        if month_start.month == 12:
-            month_end = date(month_start.year + 1, 1, 1)
-        else:
-            month_end = date(month_start.year, month_start.month + 1, 1)
+        index = bisect_left(rows.keys, key)
+        if index >= len(rows.keys) or rows.keys[index] != key:
+            return
 
-        week_groups = {}
-        month_groups = {}
-        older_groups = {}
+        date_str = _desc(key[0])
+        section, _ = rows.bucket(date_str)
+
+        # headers left without rows go with the row
+        start = index
+        rows.group_sizes[date_str] -= 1
+        if not rows.group_sizes[date_str]:
+            del rows.group_sizes[date_str]
+            start -= 1
+        rows.section_sizes[section] -= 1
+        if not rows.section_sizes[section]:
+            del rows.section_sizes[section]
+            start -= 1
+
+        del rows.keys[start : index + 1]
+        del self.rv.data[start : index + 1]
+        rows.layout = None
+
+        if not rows.keys and not rows.has_more:
+            self._show_empty()
+
+    def refresh(self, limit=None):
+        # the first page is queried and formatted on the builder thread and
+        # swapped in whole on a later frame; a newer refresh supersedes it
+        self._dirty = False
+        self._build_gen += 1
+        self._building = True
+        self._builder.request(
+            self._build_gen,
+            date.today(),
+            max(limit or 0, self.page_size),
+            self._query,
+        )
 
-        for t in transactions:
-            d = str_to_date(t["date"])
+    def stop_builder(self):
+        self._builder.stop()
+
+    def _apply_search(self, *_):
+        query = self.search_input.text.strip()
+        if query == self._query:
+            return
+
+        self._query = query
+        self.rv.scroll_y = 1
+        self.refresh()
 
-            if week_start <= d < week_end:
-                if d == today:
-                    key = "Today"
-                elif d == yesterday:
-                    key = "Yesterday"
-                else:
-                    key = t["date"]
-                week_groups.setdefault(key, []).append(t)
+    def _fetch_page(self, rows, limit, before=None):
+        if rows.query:
+            return self.db.search(rows.query, limit=limit, cursor=before)
+        return self.db.list_txns_page(before=before, limit=limit)
 
-            elif month_start <= d < month_end:
-                month_groups.setdefault(d, []).append(t)
+    def _build_rows(self, gen, today, limit, query):
+        # runs on the builder thread and touches no widget
+        if gen != self._build_gen:
+            return
 
+        try:
+            rows = _HistoryRows(today, query)
+            data = []
+            if not query:
+                rows.set_months(self.db.month_counts())
+            transactions = self._fetch_page(rows, limit)
+            if gen != self._build_gen:
+                return
+
+            if transactions:
+                self._append_transactions(rows, transactions, data, limit)
             else:
-                older_groups.setdefault(d, []).append(t)
+                rows.has_more = False
+                rows.empty = True
+                data.append(self._empty_row(query))
+        except Exception:
+            rows, data = None, None
 
-        data = []
+        Clock.schedule_once(lambda *_: self._swap_rows(gen, rows, data), 0)
+
+    def _swap_rows(self, gen, rows, data):
+        if gen != self._build_gen:
+            return
 
-        if week_groups:
-            data.append(self._section_row("This Week"))
-
-            if "Today" in week_groups:
-                data.append(self._group_row("Today"))
-                for t in week_groups["Today"]:
-                    data.append(self._build_tx_data(t))
-
-            if "Yesterday" in week_groups:
-                data.append(self._group_row("Yesterday"))
-                for t in week_groups["Yesterday"]:
-                    data.append(self._build_tx_data(t))
-
-            other_dates = [
-                k for k in week_groups.keys() if k not in ("Today", "Yesterday")
-            ]
-            other_dates.sort(reverse=True)
-
-            for date_str in other_dates:
-                data.append(self._group_row(date_str))
-                for t in week_groups[date_str]:
-                    data.append(self._build_tx_data(t))
-
-        if month_groups:
-            data.append(self._section_row("This Month"))
-            for d in sorted(month_groups.keys(), reverse=True):
-                data.append(self._group_row(d.strftime("%Y-%m-%d")))
-                for t in month_groups[d]:
-                    data.append(self._build_tx_data(t))
-
-        if older_groups:
-            data.append(self._section_row("Older"))
-            for d in sorted(older_groups.keys(), reverse=True):
-                data.append(self._group_row(d.strftime("%Y-%m-%d")))
-                for t in older_groups[d]:
-                    data.append(self._build_tx_data(t))
+        self._building = False
+        events, self._held_events = self._held_events, []
 
+        if rows is None:
+            # keep showing the old list; the next activation tries again
+            self._dirty = True
+            return
+
+        self._rows = rows
         self.rv.data = data
         self.rv.refresh_from_data()
 
+        if events:
+            self.on_db_changes(events)
+
+        # a jump that needed more rows lands once they are laid out
+        month, self._jump_month = self._jump_month, None
+        if month:
+            Clock.schedule_once(lambda *_: self.jump_to_month(month, load=False), 0)
+        else:
+            self._sync_month_controls()
+
+    def _show_empty(self):
+        self._rows.empty = True
+        self.rv.data = [self._empty_row(self._rows.query)]
+
+    def load_more(self):
+        # the page would land in rows that are about to be replaced
+        rows = self._rows
+        if self._building or not rows.has_more or rows.page_cursor is None:
+            return
+
+        transactions = self._fetch_page(rows, self.page_size, rows.page_cursor)
+        if not transactions:
+            rows.has_more = False
+            return
+
+        data = []
+        self._append_transactions(rows, transactions, data, self.page_size)
+        self.rv.data.extend(data)
+
+    def _on_rv_scroll(self, *args):
+        self._sync_month_controls()
+        if not self._rows.has_more:
+            return
+
+        hidden_h = self.rv_layout.height - self.rv.height
+        if hidden_h <= 0:
+            return
+
+        # fetch the next page while roughly two screens are still left
+        remaining = self.rv.scroll_y * hidden_h
+        if remaining < self.rv.height * 2:
+            self.load_more()
+
+    def _month_counts(self):
+        rows = self._rows
+        if rows.months is None and rows.query:
+            # search results only know the months they have loaded
+            counts = {}
+            for date_str, size in rows.group_sizes.items():
+                counts[date_str[:7]] = counts.get(date_str[:7], 0) + size
+            rows.set_months(sorted(counts.items(), reverse=True))
+        elif rows.months is None:
+            try:
+                rows.set_months(self.db.month_counts())
+            except Exception:
+                rows.set_months([])
+        return rows.months
+
+    def _scroll_top(self):
+        # y of the top of the viewport within the list
+        height = self._rows.index()[3]
+        hidden_h = height - self.rv.height
+        if hidden_h <= 0:
+            return 0
+        return (1 - self.rv.scroll_y) * hidden_h
+
+    def current_month(self):
+        _, top_list, month_list, _ = self._rows.index()
+        if not month_list:
+            return None
+        i = bisect_right(top_list, self._scroll_top() + dp(1)) - 1
+        return month_list[max(0, i)]
+
+    def jump_to_month(self, month, load=True):
+        # loaded months scroll straight to their offset; older ones are
+        # built in one go, down to the end of the month, and then scrolled to
+        if self._building:
+            self._jump_month = month
+            return
+
+        rows = self._rows
+        tops, _, _, height = rows.index()
+        if month in tops:
+            hidden_h = height - self.rv.height
+            if hidden_h > 0:
+                self.rv.scroll_y = max(0.0, min(1.0, 1 - tops[month] / hidden_h))
+            self._sync_month_controls()
+            return
+
+        if not load or not rows.has_more or rows.page_cursor is None:
+            return
+        if rows.query:
+            return
+        if month >= rows.page_cursor[0][:7]:
+            return
+
+        needed = sum(count for m, count in self._month_counts() if m >= month)
+        self._jump_month = month
+        self.refresh(limit=needed)
+
+    def step_month(self, step):
+        months = [m for m, _ in self._month_counts()]
+        if not months:
+            return
+
+        current = self.current_month()
+        if current in months:
+            i = months.index(current) + step
+        else:
+            i = 0 if step > 0 else len(months) - 1
+        self.jump_to_month(months[max(0, min(len(months) - 1, i))])
+
+    def _on_rail_drag(self, fraction, released):
+        rows = self._rows
+        months = self._month_counts()
+        if not months:
+            return
+
+        i = bisect_right(rows.month_ends, fraction * rows.month_ends[-1])
+        month = months[min(i, len(months) - 1)][0]
+
+        bubble = self.rail_bubble
+        bubble.opacity = 0 if released else 1
+        self.rail_bubble_label.text = _month_label(month)
+        bubble.right = self.rail.x - dp(6)
+        bubble.center_y = self.rail.top - self.rail.height * fraction
+
+        # dragging scrolls through what is loaded; letting go fetches the rest
+        self.jump_to_month(month, load=released)
+
+    def _sync_month_controls(self):
+        rows = self._rows
+        month = self.current_month()
+        self.month_label.text = _month_label(month) if month else ""
+
+        if self.rail.dragging:
+            return
+
+        # the thumb tracks the whole history, of which the loaded rows are
+        # the newest part
+        self._month_counts()
+        total = rows.month_ends[-1] if rows.month_ends else 0
+        loaded = len(rows.tx_keys)
+        if total and loaded:
+            hidden_h = rows.index()[3] - self.rv.height
+            seen = 1 - self.rv.scroll_y if hidden_h > 0 else 0
+            self.rail.set_fraction(seen * min(loaded, total) / total)
+        else:
+            self.rail.set_fraction(0)
+
+    def _append_transactions(self, rows, transactions, data, limit):
+        # rows arrive newest first, so a section or date group gets its
+        # header when its first row shows up, page after page
+        keys = rows.keys
+        tx_keys = rows.tx_keys
+        section_sizes = rows.section_sizes
+        group_sizes = rows.group_sizes
+
+        last_date = None
+        for t in transactions:
+            date_str = t["date"]
+            # rows come sorted, so each date is bucketed once
+            if date_str != last_date:
+                last_date = date_str
+                section, group = rows.bucket(date_str)
+
+            if not section_sizes.get(section):
+                data.append(self._section_row(section))
+                keys.append(rows.section_keys[section])
+                section_sizes[section] = 0
+
+            if not group_sizes.get(date_str):
+                data.append(self._group_row(group))
+                keys.append((_desc(date_str), ""))
+                group_sizes[date_str] = 0
+
+            key = self._tx_key(t)
+            data.append(self._build_tx_data(t))
+            keys.append(key)
+
+            tx_keys[t["id"]] = key
+            section_sizes[section] += 1
+            group_sizes[date_str] += 1
+
+        if len(transactions) < limit:
+            rows.has_more = False
+        rows.layout = None
+        if rows.query:
+            rows.months = None
+
+        last = transactions[-1]
+        rows.page_cursor = (last["date"], last["time"], last["id"])
+        rows.cursor_key = self._tx_key(last)
+
     def show_note(self, item_text: str, note_text: str):
         item = (item_text or "").strip()
         note = (note_text or "").strip()
@@ -463,18 +1047,11 @@ class HistoryScreen(BoxLayout):
             self._note_dialog.dismiss()
             self._note_dialog = None
 
-    def _refresh_after_change(self):
-        self.refresh()
-        app = App.get_running_app()
-        if app and hasattr(app, "refresh_reports"):
-            app.refresh_reports()
-
     def delete_transaction(self, txn_id):
         self.db.soft_delete(txn_id)
         self.last_deleted_id = txn_id
         self.undo_label.text = f"Deleted #{txn_id}"
         self.undo_bar.opacity = 1
-        self._refresh_after_change()
 
     def undo_last_delete(self, instance):
         if self.last_deleted_id is None:
@@ -483,7 +1060,6 @@ class HistoryScreen(BoxLayout):
         self.db.undo_delete(self.last_deleted_id)
         self.undo_bar.opacity = 0
         self.last_deleted_id = None
-        self._refresh_after_change()
 
     def delete_last_permanently(self, instance):
         if self.last_deleted_id is None:
@@ -492,4 +1068,3 @@ class HistoryScreen(BoxLayout):
         self.db.hard_delete(self.last_deleted_id)
         self.undo_bar.opacity = 0
         self.last_deleted_id = None
-        self._refresh_after_change()
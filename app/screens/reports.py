@@ -1,4 +1,4 @@
-from datetime import date, timedelta
+from datetime import date
 from kivy.app import App
 from kivy.metrics import dp
 from kivy.animation import Animation
@@ -8,13 +8,7 @@ from kivy.storage.jsonstore import JsonStore
 from kivymd.uix.card import MDCard
 from kivymd.uix.label import MDLabel
 from app.widgets.line_chart import LineChart
-from app.utils import (
-    date_to_str,
-    start_of_week_sun,
-    start_of_month,
-    start_of_year,
-    paise_to_rupees,
-)
+from app.utils import paise_to_rupees
 
 
 class ReportCard(MDCard):
@@ -79,6 +73,11 @@ class ReportScreen(BoxLayout):
         self.padding = (dp(16), dp(12), dp(16), dp(12))
         self.spacing = dp(8)
 
+        # rebuilt lazily: changes only mark the report dirty until it is shown
+        self.active = False
+        self._dirty = True
+        self._built_for = None
+
         self._week_vals = []
         self._month_vals = []
         self._year_vals = []
@@ -282,32 +281,36 @@ class ReportScreen(BoxLayout):
         for c in (self.card_week, self.card_month, self.card_year):
             c.set_opened(c._key == self._selected)
 
+    def set_active(self, active):
+        self.active = active
+        if active and (self._dirty or self._built_for != date.today()):
+            self.refresh()
+
+    def on_db_changes(self, events):
+        self._dirty = True
+        if self.active:
+            self.refresh()
+
     def refresh(self):
         self.apply_prefs()
 
         today = date.today()
+        self._dirty = False
+        self._built_for = today
 
-        week_start = start_of_week_sun(today)
-        month_start = start_of_month(today)
-        year_start = start_of_year(today)
+        bundle = self.db.report_bundle(today)
 
-        end_exclusive = date_to_str(today + timedelta(days=1))
-
-        week_total = self.db.sum_between_dates(date_to_str(week_start), end_exclusive)
-        month_total = self.db.sum_between_dates(date_to_str(month_start), end_exclusive)
-        year_total = self.db.sum_between_dates(date_to_str(year_start), end_exclusive)
+        week_total = bundle["week_total"]
+        month_total = bundle["month_total"]
+        year_total = bundle["year_total"]
 
         self.card_week._value_lbl.text = f"₹{paise_to_rupees(week_total)}"
         self.card_month._value_lbl.text = f"₹{paise_to_rupees(month_total)}"
         self.card_year._value_lbl.text = f"₹{paise_to_rupees(year_total)}"
 
-        week_vals_paise = self.db.week_daily_totals(week_start)
-        month_vals_paise = self.db.month_daily_totals(month_start)
-        year_vals_paise = self.db.year_monthly_totals(year_start)
-
-        self._week_vals = [v / 100 for v in week_vals_paise]
-        self._month_vals = [v / 100 for v in month_vals_paise]
-        self._year_vals = [v / 100 for v in year_vals_paise]
+        self._week_vals = [v / 100 for v in bundle["week_daily"]]
+        self._month_vals = [v / 100 for v in bundle["month_daily"]]
+        self._year_vals = [v / 100 for v in bundle["year_monthly"]]
 
         self._week_labels = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
         self._month_labels = [str(i) for i in range(1, len(self._month_vals) + 1)]
@@ -104,6 +104,15 @@ class SettingsScreen(BoxLayout):
                 lambda *_: self.drive_sync.sync_db(self.db),
             )
         )
+        self.root_column.add_widget(
+            self._action_button(
+                "CANCEL BACKUP",
+                lambda *_: self.drive_sync.cancel_backup(),
+            )
+        )
+        # only usable while a backup job is running
+        self.cancel_backup_button = self._action_buttons[-1]
+        self.cancel_backup_button.disabled = True
         self.root_column.add_widget(
             self._action_button(
                 "IMPORT TRANSACTIONS FROM JSON",
@@ -114,6 +123,49 @@ class SettingsScreen(BoxLayout):
             )
         )
 
+        self.root_column.add_widget(
+            self._action_button(
+                "REBUILD REPORT TOTALS",
+                lambda *_: self._rebuild_report_totals(),
+            )
+        )
+
+        self.root_column.add_widget(
+            self._choice_row(
+                "Backup mode",
+                "backup_mode",
+                [
+                    ("full", "Full JSON"),
+                    ("incremental", "Incremental"),
+                    ("sqlite", "SQLite"),
+                ],
+                on_change=self._after_backup_mode_change,
+            )
+        )
+
+        self.root_column.add_widget(
+            self._choice_row(
+                "Compress backups",
+                "backup_compression",
+                [("off", "Off"), ("gzip", "Gzip")],
+            )
+        )
+
+        self.root_column.add_widget(
+            self._choice_row(
+                "Auto backup",
+                "auto_backup_policy",
+                [
+                    ("month_end", "Month end"),
+                    ("weekly", "Weekly"),
+                    ("daily", "Daily"),
+                    ("changes", "50 changes"),
+                    ("off", "Off"),
+                ],
+                on_change=self._after_backup_policy_change,
+            )
+        )
+
         # ---------- Entry ----------
         self.root_column.add_widget(self._section_title("Entry Preferences"))
 
@@ -526,6 +578,10 @@ class SettingsScreen(BoxLayout):
         self.refresh_status_meta()
 
     def refresh_status_meta(self):
+        # every backup start and finish reports a status, so the cancel
+        # button follows the running job from here
+        self.cancel_backup_button.disabled = not self.drive_sync.is_backup_running()
+
         last_backup_at = getattr(self.drive_sync, "last_backup_at", None)
         if last_backup_at:
             try:
@@ -556,13 +612,25 @@ class SettingsScreen(BoxLayout):
             except Exception:
                 pass
 
-    def _after_import(self, imported_count, skipped_count):
+    def _after_backup_policy_change(self, *_):
         app = App.get_running_app()
-        if app and hasattr(app, "refresh_history"):
-            app.refresh_history()
-        if app and hasattr(app, "refresh_reports"):
-            app.refresh_reports()
+        if app and hasattr(app, "reschedule_backups"):
+            app.reschedule_backups()
+
+    def _after_backup_mode_change(self, *_):
+        if not self.drive_sync.is_backup_running():
+            self.drive_sync.sync_change_log(self.db)
+
+    def _rebuild_report_totals(self):
+        try:
+            self.db.rebuild_daily_totals()
+        except Exception as e:
+            self._set_status(f"Rebuild failed: {e}")
+            return
 
+        self._set_status("Report totals rebuilt")
+
+    def _after_import(self, imported_count, skipped_count):
         self._set_status(
             f"Imported {imported_count} transaction(s), skipped {skipped_count} duplicate(s)"
         )
@@ -0,0 +1,147 @@
+from datetime import datetime, time, timedelta
+from kivy.app import App
+from kivy.clock import Clock
+from kivy.storage.jsonstore import JsonStore
+
+# a slot still counts as due this long after its start, like the old
+# "first 5 minutes of the hour" window
+GRACE = timedelta(minutes=5)
+
+# hours of the day each timed policy backs up at
+POLICY_HOURS = {
+    "month_end": (11, 23),
+    "daily": (23,),
+    "weekly": (23,),
+}
+
+
+def _is_policy_day(policy, day):
+    if policy == "month_end":
+        return (day + timedelta(days=1)).month != day.month
+    if policy == "weekly":
+        # weeks run Sunday to Saturday across the app
+        return day.weekday() == 5
+    return policy == "daily"
+
+
+def next_slot(policy, now, after=None):
+    # earliest slot of `policy` that is still due at `now` and later than
+    # `after`; None for policies without a clock
+    hours = POLICY_HOURS.get(policy)
+    if not hours:
+        return None
+
+    day = (now - GRACE).date()
+    for _ in range(62):
+        if _is_policy_day(policy, day):
+            for hour in hours:
+                slot = datetime.combine(day, time(hour))
+                if slot < now - GRACE:
+                    continue
+                if after is not None and slot <= after:
+                    continue
+                return slot
+        day += timedelta(days=1)
+    return None
+
+
+class BackupScheduler:
+    # one Clock event for the next due slot instead of a polling tick; the
+    # "changes" policy has no timer at all and reacts to database writes
+    CHANGE_THRESHOLD = 50
+
+    def __init__(self, drive_sync, db):
+        self.drive_sync = drive_sync
+        self.db = db
+        self._event = None
+        self._slot = None
+        self._policy = None
+        self._attempted = 0
+        self._change_trigger = Clock.create_trigger(self._check_changes, 1)
+        self._started = False
+
+    def start(self):
+        if not self._started:
+            self.db.add_change_listener(self._on_db_change)
+            self._started = True
+        self.reschedule()
+
+    def stop(self):
+        if self._started:
+            self.db.remove_change_listener(self._on_db_change)
+            self._started = False
+        self._cancel()
+        self._change_trigger.cancel()
+
+    def reschedule(self, *_):
+        # cheap enough to call on every resume and policy change
+        self._cancel()
+        if not self._started:
+            return
+
+        self._policy = policy = self.policy()
+        if policy == "changes":
+            self._change_trigger()
+            return
+
+        slot = next_slot(policy, datetime.now(), after=self._slot)
+        if slot is None:
+            return
+
+        delay = max(0, (slot - datetime.now()).total_seconds())
+        self._event = Clock.schedule_once(lambda *_: self._on_slot(slot), delay)
+
+    def policy(self):
+        try:
+            app = App.get_running_app()
+            base = app.user_data_dir if app else "."
+            store = JsonStore(f"{base}/settings.json")
+            if store.exists("prefs"):
+                return store.get("prefs").get("auto_backup_policy", "month_end")
+        except Exception:
+            pass
+        return "month_end"
+
+    def _cancel(self):
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+
+    def _on_slot(self, slot):
+        self._event = None
+        self._slot = slot
+
+        # the clock does not run while the app is paused, so a late wakeup
+        # past the grace window is skipped rather than fired
+        if datetime.now() - slot <= GRACE:
+            self.drive_sync.auto_backup(self.db, slot.strftime("%Y-%m-%d-%H%M"))
+
+        self.reschedule()
+
+    def _on_db_change(self, kind, ids):
+        # writes may come from any thread; they are counted on the UI thread
+        # and the check runs there at most once per second. the database's
+        # change log is not used: it only records while a journal is linked
+        if kind == "rebuild":
+            return
+        # imports do not say how many rows they wrote; one counts as a batch
+        count = self.CHANGE_THRESHOLD if ids is None else len(ids)
+        Clock.schedule_once(lambda *_: self._count_changes(count), 0)
+
+    def _count_changes(self, count):
+        self.drive_sync.note_changes(count)
+        if self._policy == "changes":
+            self._change_trigger()
+
+    def _check_changes(self, *_):
+        # a failed attempt waits for another batch of changes before retrying
+        pending = self.drive_sync.changes_since_backup
+        if pending < self._attempted:
+            # a backup went through since the last attempt
+            self._attempted = 0
+        if pending - self._attempted < self.CHANGE_THRESHOLD:
+            return
+
+        self._attempted = pending
+        key = datetime.now().strftime("changes-%Y-%m-%d-%H%M%S")
+        self.drive_sync.auto_backup(self.db, key, interactive=False)
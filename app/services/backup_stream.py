@@ -0,0 +1,558 @@
+import codecs
+import json
+import struct
+import zlib
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# longest single JSON value (a row or header) an import will buffer; real
+# rows are well under a kilobyte
+MAX_VALUE_CHARS = 1024 * 1024
+WRITE_CHUNK_SIZE = 64 * 1024
+
+# backups with more rows than this are written without indentation
+COMPACT_THRESHOLD = 1000
+
+JOURNAL_SOURCE = "txtracker_journal"
+
+GZIP_MAGIC = b"\x1f\x8b"
+GZIP_LEVEL = 6
+# FEXTRA subfield that carries the backup metadata as compact JSON
+GZIP_SUBFIELD_ID = b"TX"
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+_FHCRC = 0x02
+_FEXTRA = 0x04
+_FNAME = 0x08
+_FCOMMENT = 0x10
+
+
+class BackupFormatError(ValueError):
+    pass
+
+
+class MemoryInputStream:
+    # java.io.InputStream look-alike over bytes, so the stream readers can be
+    # exercised and timed off-device
+
+    def __init__(self, data):
+        self._data = memoryview(bytes(data))
+        self._pos = 0
+
+    def read(self, buf=None, off=0, length=None):
+        if self._pos >= len(self._data):
+            return -1
+
+        if buf is None:
+            value = self._data[self._pos]
+            self._pos += 1
+            return value
+
+        if length is None:
+            length = len(buf) - off
+        end = min(self._pos + length, len(self._data))
+        count = end - self._pos
+        buf[off : off + count] = self._data[self._pos : end]
+        self._pos = end
+        return count
+
+    def close(self):
+        self._data = memoryview(b"")
+        self._pos = 0
+
+
+def iter_stream_chunks(stream, chunk_size=READ_CHUNK_SIZE):
+    # bulk read(byte[], off, len) into one reusable buffer: a single JNI
+    # round trip per chunk instead of one per byte
+    buf = bytearray(chunk_size)
+    while True:
+        count = stream.read(buf, 0, chunk_size)
+        if count < 0:
+            return
+        if count:
+            yield bytes(buf[:count])
+
+
+class _ByteReader:
+    def __init__(self, byte_chunks):
+        self._chunks = iter(byte_chunks)
+        self.buf = b""
+
+    def fill(self, size):
+        while len(self.buf) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return False
+            self.buf += chunk
+        return True
+
+    def take(self, size):
+        if not self.fill(size):
+            raise BackupFormatError("Compressed backup is truncated")
+        data = self.buf[:size]
+        self.buf = self.buf[size:]
+        return data
+
+    def take_zero_terminated(self):
+        while b"\0" not in self.buf:
+            if not self.fill(len(self.buf) + 1):
+                raise BackupFormatError("Compressed backup is truncated")
+        return self.take(self.buf.index(b"\0") + 1)
+
+    def next_chunk(self):
+        if self.buf:
+            data = self.buf
+            self.buf = b""
+            return data
+        return next(self._chunks, None)
+
+
+def iter_gzip(chunks, meta, mtime=0, level=GZIP_LEVEL):
+    # one gzip member (RFC 1952): `meta` rides in an FEXTRA subfield, the
+    # header is covered by its own CRC16 (FHCRC), and the trailer CRC32 and
+    # length cover the payload. members can be appended to one another
+    extra = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+    subfield = GZIP_SUBFIELD_ID + struct.pack("<H", len(extra)) + extra
+    header = (
+        GZIP_MAGIC
+        + bytes((8, _FEXTRA | _FHCRC))
+        + struct.pack("<I", mtime & 0xFFFFFFFF)
+        + b"\0\xff"
+        + struct.pack("<H", len(subfield))
+        + subfield
+    )
+    yield header + struct.pack("<H", zlib.crc32(header) & 0xFFFF)
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    crc = 0
+    size = 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+
+    yield compressor.flush() + struct.pack("<II", crc, size & 0xFFFFFFFF)
+
+
+def _read_gzip_header(reader):
+    header = reader.take(10)
+    if header[:3] != GZIP_MAGIC + b"\x08":
+        raise BackupFormatError("Invalid compressed backup")
+
+    flags = header[3]
+    meta = {}
+    if flags & _FEXTRA:
+        size = reader.take(2)
+        extra = reader.take(struct.unpack("<H", size)[0])
+        header += size + extra
+        pos = 0
+        while pos + 4 <= len(extra):
+            field_size = struct.unpack("<H", extra[pos + 2 : pos + 4])[0]
+            if extra[pos : pos + 2] == GZIP_SUBFIELD_ID:
+                try:
+                    meta = json.loads(extra[pos + 4 : pos + 4 + field_size])
+                except ValueError:
+                    raise BackupFormatError("Invalid compressed backup")
+            pos += 4 + field_size
+    if flags & _FNAME:
+        header += reader.take_zero_terminated()
+    if flags & _FCOMMENT:
+        header += reader.take_zero_terminated()
+    if flags & _FHCRC:
+        expected = struct.unpack("<H", reader.take(2))[0]
+        if expected != zlib.crc32(header) & 0xFFFF:
+            raise BackupFormatError("Compressed backup header is corrupted")
+
+    return meta if isinstance(meta, dict) else {}
+
+
+def iter_gunzip(byte_chunks, members=None):
+    # inflates every member in turn, checking each header and trailer;
+    # the metadata of each member is appended to `members` as it is read
+    reader = _ByteReader(byte_chunks)
+    while True:
+        meta = _read_gzip_header(reader)
+        if members is not None:
+            members.append(meta)
+
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        crc = 0
+        size = 0
+        while not decompressor.eof:
+            chunk = reader.next_chunk()
+            if chunk is None:
+                raise BackupFormatError("Compressed backup is truncated")
+            try:
+                data = decompressor.decompress(chunk)
+            except zlib.error:
+                raise BackupFormatError("Compressed backup is corrupted")
+            if data:
+                crc = zlib.crc32(data, crc)
+                size += len(data)
+                yield data
+
+        reader.buf = decompressor.unused_data + reader.buf
+        expected_crc, expected_size = struct.unpack("<II", reader.take(8))
+        if expected_crc != crc or expected_size != size & 0xFFFFFFFF:
+            raise BackupFormatError("Compressed backup is corrupted")
+
+        if not reader.fill(1):
+            return
+
+
+def peek_bytes(byte_chunks, size):
+    # returns the first `size` bytes and an iterator over all of them
+    chunks = iter(byte_chunks)
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= size:
+            break
+    return head[:size], _prepend(head, chunks)
+
+
+def _prepend(first, chunks):
+    if first:
+        yield first
+    yield from chunks
+
+
+def iter_backup_bytes(byte_chunks, members=None):
+    # passes plain backups through and inflates gzip ones, told apart by
+    # the first two bytes
+    head, chunks = peek_bytes(byte_chunks, len(GZIP_MAGIC))
+    if head == GZIP_MAGIC:
+        return iter_gunzip(chunks, members)
+    return chunks
+
+
+def iter_file_chunks(path, chunk_size=WRITE_CHUNK_SIZE):
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                return
+            yield data
+
+
+def iter_checked_records(records, members):
+    # compares the row count promised by the compressed headers with the
+    # rows actually read, so a short file fails before anything commits
+    rows = 0
+    for kind, value in records:
+        if kind == "row":
+            rows += 1
+        yield kind, value
+
+    if members and all("row_count" in meta for meta in members):
+        if sum(meta["row_count"] for meta in members) != rows:
+            raise BackupFormatError("Backup row count does not match its header")
+
+
+def iter_decoded_text(byte_chunks):
+    # a file cut inside a multi-byte character is reported like any other
+    # damaged backup
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    try:
+        for chunk in byte_chunks:
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+
+        tail = decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise BackupFormatError("Backup is not valid UTF-8 text")
+    if tail:
+        yield tail
+
+
+class _JsonStreamReader:
+    # walks a JSON text that arrives in chunks, decoding one value at a
+    # time so only the current value is ever held in memory
+
+    def __init__(self, text_chunks):
+        self._chunks = iter(text_chunks)
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        if self._eof:
+            return False
+
+        for chunk in self._chunks:
+            if not chunk:
+                continue
+            if self._pos:
+                self._buf = self._buf[self._pos :]
+                self._pos = 0
+            self._buf += chunk
+            return True
+
+        self._eof = True
+        return False
+
+    def skip_ws(self):
+        while True:
+            buf = self._buf
+            pos = self._pos
+            size = len(buf)
+            while pos < size and buf[pos] in " \t\r\n":
+                pos += 1
+            self._pos = pos
+            if pos < size or not self._fill():
+                return
+
+    def peek(self):
+        self.skip_ws()
+        if self._pos < len(self._buf):
+            return self._buf[self._pos]
+        return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise BackupFormatError("Invalid JSON file")
+        self._pos += 1
+
+    def _cut_short(self, error):
+        # whether more text could fix the error: it sits at the end of the
+        # buffer (a \uXXXX escape can be cut up to 6 chars early), or it is
+        # a string that never closed. anything else is a real syntax error
+        if error.pos >= len(self._buf) - 6:
+            return True
+        return error.msg.startswith("Unterminated string")
+
+    def _refill_value(self):
+        # a value still incomplete after MAX_VALUE_CHARS is not a backup row
+        if len(self._buf) - self._pos > MAX_VALUE_CHARS:
+            raise BackupFormatError("Invalid JSON file")
+        return self._fill()
+
+    def value(self):
+        self.skip_ws()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as e:
+                if self._cut_short(e) and self._refill_value():
+                    continue
+                raise BackupFormatError("Invalid JSON file")
+
+            # a number or literal cut at the chunk edge decodes "fine";
+            # only trust values that end before the buffered text does
+            if end == len(self._buf) and self._refill_value():
+                continue
+
+            self._pos = end
+            return value
+
+    def array_items(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+
+        while True:
+            yield self.value()
+            char = self.peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise BackupFormatError("Invalid JSON file")
+
+    def at_end(self):
+        return self.peek() == ""
+
+
+def _is_header(value):
+    return isinstance(value, dict) and "date" not in value and (
+        "source" in value or "schema_version" in value
+    )
+
+
+def iter_backup_records(text_chunks):
+    # accepts the schema_version 1 document, a bare list of rows, or
+    # newline-delimited JSON with one row per line and optional header lines;
+    # yields ("header", value) and ("row", value) pairs in file order
+    reader = _JsonStreamReader(text_chunks)
+    first = reader.peek()
+
+    if first == "[":
+        for row in reader.array_items():
+            yield "row", row
+        if not reader.at_end():
+            raise BackupFormatError("Invalid JSON file")
+        return
+
+    if first != "{":
+        if first == "":
+            raise BackupFormatError("Invalid JSON file")
+        raise BackupFormatError("Invalid transactions format")
+
+    reader.expect("{")
+    head = {}
+    saw_transactions = False
+
+    if reader.peek() == "}":
+        reader.expect("}")
+    else:
+        while True:
+            key = reader.value()
+            if not isinstance(key, str):
+                raise BackupFormatError("Invalid JSON file")
+            reader.expect(":")
+
+            if key == "transactions":
+                if reader.peek() != "[":
+                    raise BackupFormatError("Invalid transactions format")
+                saw_transactions = True
+                yield "header", head
+                for row in reader.array_items():
+                    yield "row", row
+            else:
+                head[key] = reader.value()
+
+            char = reader.peek()
+            if char not in (",", "}"):
+                raise BackupFormatError("Invalid JSON file")
+            reader.expect(char)
+            if char == "}":
+                break
+
+    if reader.at_end():
+        return
+
+    if saw_transactions:
+        raise BackupFormatError("Invalid JSON file")
+
+    # more values follow the first object: newline-delimited rows
+    value = head
+    while True:
+        yield ("header" if _is_header(value) else "row"), value
+        if reader.at_end():
+            return
+        value = reader.value()
+
+
+def is_journal_header(value):
+    return isinstance(value, dict) and value.get("source") == JOURNAL_SOURCE
+
+
+def iter_journal_changes(records):
+    # a journal is a snapshot segment followed by delta segments, each
+    # opened by a header line; snapshot rows replay as live upserts
+    segment = None
+    for kind, value in records:
+        if kind == "header":
+            if not is_journal_header(value):
+                raise BackupFormatError("Invalid journal file")
+            segment = value.get("kind")
+        elif segment == "snapshot":
+            if isinstance(value, dict):
+                value = dict(value, op="upsert", deleted=0)
+            yield value
+        elif segment == "delta":
+            yield value
+        else:
+            raise BackupFormatError("Invalid journal file")
+
+
+def _iter_lines(head, values):
+    parts = [json.dumps(head, separators=(",", ":")) + "\n"]
+    size = len(parts[0])
+
+    for value in values:
+        text = json.dumps(value, ensure_ascii=False, separators=(",", ":")) + "\n"
+        parts.append(text)
+        size += len(text)
+        if size >= WRITE_CHUNK_SIZE:
+            yield "".join(parts).encode("utf-8")
+            parts = []
+            size = 0
+
+    if parts:
+        yield "".join(parts).encode("utf-8")
+
+
+def iter_journal_snapshot(rows, count, seq, exported_at):
+    # starts a journal file; deltas are appended after it
+    head = {
+        "schema_version": 1,
+        "source": JOURNAL_SOURCE,
+        "kind": "snapshot",
+        "seq": seq,
+        "exported_at": exported_at,
+        "transaction_count": count,
+    }
+    return _iter_lines(head, rows)
+
+
+def iter_journal_delta(changes, count, since_seq, seq, exported_at):
+    head = {
+        "schema_version": 1,
+        "source": JOURNAL_SOURCE,
+        "kind": "delta",
+        "since_seq": since_seq,
+        "seq": seq,
+        "exported_at": exported_at,
+        "change_count": count,
+    }
+    return _iter_lines(head, changes)
+
+
+def iter_backup_json(rows, count, exported_at, compact=None):
+    # encodes the schema_version 1 document piece by piece and yields it as
+    # UTF-8 blocks of about WRITE_CHUNK_SIZE; with compact=False the output
+    # matches json.dumps(payload, indent=2)
+    if compact is None:
+        compact = count > COMPACT_THRESHOLD
+
+    head = {
+        "schema_version": 1,
+        "source": "txtracker_backup",
+        "exported_at": exported_at,
+        "transaction_count": count,
+    }
+
+    if compact:
+        opening = json.dumps(head, separators=(",", ":"))[:-1]
+        opening += ',"transactions":['
+    else:
+        opening = json.dumps(head, indent=2)[:-2]
+        opening += ',\n  "transactions": ['
+
+    parts = [opening]
+    size = len(opening)
+    wrote_rows = False
+
+    for row in rows:
+        if compact:
+            text = json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+        else:
+            text = json.dumps(row, ensure_ascii=False, indent=2)
+            text = "\n    " + text.replace("\n", "\n    ")
+
+        if wrote_rows:
+            text = "," + text
+        wrote_rows = True
+
+        parts.append(text)
+        size += len(text)
+        if size >= WRITE_CHUNK_SIZE:
+            yield "".join(parts).encode("utf-8")
+            parts = []
+            size = 0
+
+    if compact:
+        parts.append("]}")
+    elif wrote_rows:
+        parts.append("\n  ]\n}")
+    else:
+        parts.append("]\n}")
+
+    yield "".join(parts).encode("utf-8")
@@ -0,0 +1,110 @@
+import queue
+import threading
+from kivy.clock import Clock
+from kivy.utils import platform
+
+
+class BackupCancelled(Exception):
+    pass
+
+
+class BackupJob:
+    def __init__(self, run, on_done=None, on_status=None):
+        self.run = run
+        self.on_done = on_done
+        self.on_status = on_status
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise BackupCancelled()
+
+    def report(self, text: str):
+        # called from the worker; status callbacks always run on the UI thread
+        if self.on_status:
+            Clock.schedule_once(lambda *_: self.on_status(text), 0)
+
+
+class BackupWorker:
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._current = None
+        self._lock = threading.Lock()
+
+    def submit(self, run, on_done=None, on_status=None):
+        job = BackupJob(run, on_done=on_done, on_status=on_status)
+        self._ensure_thread()
+        self._jobs.put(job)
+        return job
+
+    def cancel_all(self):
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job.cancel()
+                self._finish(job, None, BackupCancelled())
+
+        current = self._current
+        if current is not None:
+            current.cancel()
+
+    def stop(self):
+        self.cancel_all()
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+
+        if thread is not None:
+            self._jobs.put(None)
+            thread.join(timeout=2)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._loop, name="backup-worker", daemon=True
+            )
+            self._thread.start()
+
+    def _loop(self):
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+
+                self._current = job
+                result, error = None, None
+                try:
+                    job.check_cancelled()
+                    result = job.run(job)
+                except Exception as e:
+                    error = e
+                finally:
+                    self._current = None
+
+                self._finish(job, result, error)
+        finally:
+            if platform == "android":
+                try:
+                    from jnius import detach
+
+                    detach()
+                except Exception:
+                    pass
+
+    def _finish(self, job, result, error):
+        if job.on_done:
+            Clock.schedule_once(lambda *_: job.on_done(result, error), 0)
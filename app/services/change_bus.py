@@ -0,0 +1,47 @@
+import threading
+from kivy.clock import Clock
+
+
+class ChangeBus:
+    # forwards database change events to UI subscribers. events published
+    # during one frame, from any thread, are delivered together on the UI
+    # thread in the next frame as a list of (kind, ids)
+
+    def __init__(self):
+        self._subscribers = []
+        self._pending = []
+        self._lock = threading.Lock()
+        self._trigger = Clock.create_trigger(self._dispatch, 0)
+
+    def attach(self, db):
+        db.add_change_listener(self.publish)
+
+    def detach(self, db):
+        db.remove_change_listener(self.publish)
+
+    def subscribe(self, callback):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def publish(self, kind, ids=None):
+        with self._lock:
+            self._pending.append((kind, ids))
+        self._trigger()
+
+    def _dispatch(self, *_):
+        with self._lock:
+            events = self._pending
+            self._pending = []
+
+        if not events:
+            return
+
+        for callback in list(self._subscribers):
+            try:
+                callback(events)
+            except Exception:
+                pass
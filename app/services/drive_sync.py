@@ -1,27 +1,67 @@
-import json
+import os
 import time
-from datetime import datetime, timedelta
+from itertools import chain
+from datetime import datetime
 from kivy.app import App
 from kivy.storage.jsonstore import JsonStore
 from kivy.utils import platform
+from app.services.backup_stream import (
+    SQLITE_MAGIC,
+    BackupFormatError,
+    is_journal_header,
+    iter_backup_bytes,
+    iter_backup_json,
+    iter_backup_records,
+    iter_checked_records,
+    iter_decoded_text,
+    iter_file_chunks,
+    iter_gzip,
+    iter_journal_changes,
+    iter_journal_delta,
+    iter_journal_snapshot,
+    iter_stream_chunks,
+    peek_bytes,
+)
+from app.services.backup_worker import BackupCancelled, BackupWorker
 
 
 class DriveSyncService:
+    # incremental mode rewrites the journal with a full snapshot after this
+    # many appended deltas, so restores never replay a long tail
+    FULL_SNAPSHOT_EVERY = 12
+
     def __init__(self):
         self.uri = None
+        # extension the linked file was created with; a backup in another
+        # mode or compression needs a new file
+        self.link_format = None
         self._status_cb = None
         self._resolver = None
         self._activity = None
         self._Intent = None
         self._request_code = 1234
 
-        self._pending_payload = None
+        self._pending_backup_db = None
         self._pending_action = None
+        self._pending_link_format = None
         self._pending_import_db = None
         self._pending_import_complete_cb = None
 
+        self._worker = BackupWorker()
+        self._backup_job = None
+
         self.last_auto_sync_key = None
         self.last_backup_at = None
+        # writes counted since the last successful backup, for the
+        # "changes" auto backup policy
+        self.changes_since_backup = 0
+
+        # what the linked file holds when it is a journal: the change
+        # sequence it covers and how many deltas follow its snapshot
+        self.journal_uri = None
+        self.journal_seq = None
+        self.journal_deltas = 0
+        self.journal_gzip = False
 
         if platform == "android":
             from jnius import autoclass
@@ -49,27 +89,90 @@ class DriveSyncService:
         if self._status_cb:
             self._status_cb(msg)
 
-    def _build_backup_payload(self, db):
-        txns = db.list_txns()
-        return {
-            "schema_version": 1,
-            "source": "txtracker_backup",
-            "exported_at": int(time.time()),
-            "transaction_count": len(txns),
-            "transactions": txns,
-        }
-
-    def link_drive(self, title: str = "txtracker_backup.json", payload=None):
+    def stop(self):
+        self._worker.stop()
+        self._backup_job = None
+
+    def cancel_backup(self):
+        if self._backup_job is not None:
+            self._backup_job.cancel()
+
+    def is_backup_running(self):
+        return self._backup_job is not None
+
+    def _start_backup(self, db, uri, on_success, on_failure):
+        # serialization and the content resolver write run on the backup
+        # worker; the callbacks below are delivered on the UI thread
+        mode = self._backup_mode()
+        compress = self._compress_backups()
+        journal_seq = None
+        if mode == "incremental" and self._journal_matches(uri, compress):
+            journal_seq = self.journal_seq
+        # writes made while the backup runs still count towards the next one
+        counted = self.changes_since_backup
+
+        def run(job):
+            job.report("Writing backup...")
+            if mode == "sqlite":
+                return self._write_snapshot_to_uri(uri, db, job, compress)
+            return self._write_backup_to_uri(
+                uri, db, job, mode == "incremental", journal_seq, compress
+            )
+
+        def done(result, error):
+            if self._backup_job is job:
+                self._backup_job = None
+
+            if error is None:
+                self.changes_since_backup = max(
+                    0, self.changes_since_backup - counted
+                )
+                self._record_backup(uri, result, compress)
+            # only once the journal state above is settled: a new snapshot
+            # has to keep logging for the deltas that follow it
+            self.sync_change_log(db)
+
+            if error is None:
+                on_success()
+            elif isinstance(error, BackupCancelled):
+                self._set_status("Backup cancelled")
+            else:
+                on_failure(str(error))
+
+        if self.is_backup_running():
+            self._set_status("A backup is already in progress")
+            return None
+
+        if self.link_format != self._backup_extension():
+            on_failure("the file was created for another backup format")
+            return None
+
+        job = self._worker.submit(run, on_done=done, on_status=self._set_status)
+        self._backup_job = job
+        return job
+
+    def link_drive(self, title: str = None, db=None):
         if platform != "android":
             self._set_status("Drive sync available on Android only")
             return
 
+        if title is None:
+            title = "txtracker_backup" + self._backup_extension()
+
         self._pending_action = "create_backup_file"
-        self._pending_payload = payload
+        self._pending_backup_db = db
+        self._pending_link_format = self._backup_extension()
 
         intent = self._Intent(self._Intent.ACTION_CREATE_DOCUMENT)
         intent.addCategory(self._Intent.CATEGORY_OPENABLE)
-        intent.setType("application/json")
+        if title.endswith(".gz"):
+            intent.setType("application/gzip")
+        elif title.endswith(".sqlite3"):
+            intent.setType("application/vnd.sqlite3")
+        elif title.endswith(".ndjson"):
+            intent.setType("application/x-ndjson")
+        else:
+            intent.setType("application/json")
         intent.putExtra(self._Intent.EXTRA_TITLE, title)
         intent.addFlags(self._Intent.FLAG_GRANT_READ_URI_PERMISSION)
         intent.addFlags(self._Intent.FLAG_GRANT_WRITE_URI_PERMISSION)
@@ -88,7 +191,17 @@ class DriveSyncService:
 
         intent = self._Intent(self._Intent.ACTION_OPEN_DOCUMENT)
         intent.addCategory(self._Intent.CATEGORY_OPENABLE)
-        intent.setType("application/json")
+        intent.setType("*/*")
+        intent.putExtra(
+            self._Intent.EXTRA_MIME_TYPES,
+            [
+                "application/json",
+                "application/x-ndjson",
+                "application/gzip",
+                "application/vnd.sqlite3",
+                "application/octet-stream",
+            ],
+        )
         intent.addFlags(self._Intent.FLAG_GRANT_READ_URI_PERMISSION)
         intent.addFlags(self._Intent.FLAG_GRANT_PERSISTABLE_URI_PERMISSION)
 
@@ -131,16 +244,18 @@ class DriveSyncService:
 
     def _handle_create_backup_file(self, intent, uri):
         self.uri = uri
+        self.link_format = self._pending_link_format
         self._persist_permissions(intent, uri, include_write=True)
         self._save_link()
-
-        if self._pending_payload is not None:
-            ok, err = self._write_to_uri(uri, self._pending_payload)
-            if ok:
-                self._mark_backup_complete()
-                self._set_status("Drive backup complete")
-            else:
-                self._set_status(f"Drive backup failed: {err}")
+        self._forget_journal()
+
+        if self._pending_backup_db is not None:
+            self._start_backup(
+                self._pending_backup_db,
+                uri,
+                on_success=self._on_manual_backup_done,
+                on_failure=lambda err: self._set_status(f"Drive backup failed: {err}"),
+            )
         else:
             self._set_status("Drive linked")
 
@@ -149,42 +264,35 @@ class DriveSyncService:
     def _handle_import_json(self, intent, uri):
         self._persist_permissions(intent, uri, include_write=False)
 
-        try:
-            raw_text = self._read_text_from_uri(uri)
-        except Exception as e:
+        db = self._pending_import_db
+        if db is None:
             self._clear_pending()
-            self._set_status(f"Could not read JSON file: {e}")
+            self._set_status("Import database not available")
             return
 
+        # rows are parsed and inserted chunk by chunk while the file is read;
+        # any error rolls the whole import back. compressed backups and
+        # SQLite snapshots are recognised by their magic bytes
         try:
-            payload = json.loads(raw_text)
-        except Exception:
+            members = []
+            raw = iter_backup_bytes(self._iter_bytes_from_uri(uri), members)
+            head, raw = peek_bytes(raw, len(SQLITE_MAGIC))
+            if head == SQLITE_MAGIC:
+                imported_count, skipped_count = self._merge_snapshot_bytes(db, raw)
+            else:
+                records = iter_checked_records(
+                    iter_backup_records(iter_decoded_text(raw)), members
+                )
+                imported_count, skipped_count = self._import_records(db, records)
+        except BackupFormatError as e:
             self._clear_pending()
-            self._set_status("Invalid JSON file")
+            self._set_status(str(e))
             return
-
-        if isinstance(payload, dict):
-            transactions = payload.get("transactions", [])
-        elif isinstance(payload, list):
-            transactions = payload
-        else:
-            transactions = None
-
-        if not isinstance(transactions, list):
+        except Exception as e:
             self._clear_pending()
-            self._set_status("Invalid transactions format")
+            self._set_status(f"Could not read backup file: {e}")
             return
 
-        db = self._pending_import_db
-        if db is None:
-            self._clear_pending()
-            self._set_status("Import database not available")
-            return
-
-        imported_count, skipped_count = db.import_transactions(
-            transactions, skip_duplicates=True
-        )
-
         if self._pending_import_complete_cb:
             try:
                 self._pending_import_complete_cb(imported_count, skipped_count)
@@ -196,102 +304,338 @@ class DriveSyncService:
         )
         self._clear_pending()
 
+    def _import_records(self, db, records):
+        first = next(records, None)
+        if first is not None:
+            records = chain([first], records)
+
+        if first is not None and is_journal_header(first[1]):
+            # journal: replay the snapshot, then every delta in order
+            return db.apply_changes(iter_journal_changes(records))
+
+        return db.import_transactions(
+            (value for kind, value in records if kind == "row"),
+            skip_duplicates=True,
+        )
+
+    def _merge_snapshot_bytes(self, db, byte_chunks):
+        # SQLite can only attach a file, so the snapshot is spooled to the
+        # app's storage first
+        path = self._scratch_path("import_snapshot.sqlite3")
+        try:
+            with open(path, "wb") as f:
+                for chunk in byte_chunks:
+                    f.write(chunk)
+            return db.merge_snapshot(path)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
     def sync_db(self, db):
         if platform != "android":
             self._set_status("Drive sync available on Android only")
             return
 
-        payload = self._build_backup_payload(db)
+        timestamp = time.strftime("%Y-%m-%d")
+        filename = self._backup_filename(timestamp)
 
-        if self.uri:
-            ok, err = self._write_to_uri(self.uri, payload)
-            if ok:
-                self._mark_backup_complete()
-                self._set_status("Drive backup complete")
-                return
+        if not self.uri:
+            self.link_drive(title=filename, db=db)
+            return
 
+        def on_failure(err):
             self._set_status(
                 f"Linked Drive file failed: {err}. Create a new backup file"
             )
+            self.link_drive(title=filename, db=db)
 
-        timestamp = time.strftime("%Y-%m-%d")
-        filename = f"TxTracker_backup_{timestamp}.json"
-        self.link_drive(title=filename, payload=payload)
+        self._start_backup(
+            db,
+            self.uri,
+            on_success=self._on_manual_backup_done,
+            on_failure=on_failure,
+        )
+
+    def _on_manual_backup_done(self):
+        self._mark_backup_complete()
+        self._set_status("Drive backup complete")
 
-    def auto_sync_if_due(self, db):
+    def auto_backup(self, db, key, interactive=True):
+        # runs one scheduled backup; `key` names the slot so it never runs
+        # twice. interactive backups may ask for a new file when the linked
+        # one is missing or fails
         if platform != "android":
             return
 
-        now = datetime.now()
-        today = now.date()
-        next_day = today + timedelta(days=1)
-        is_month_end = next_day.month != today.month
-
-        if not is_month_end:
+        if self.last_auto_sync_key == key:
             return
 
-        # allow first 5 minutes of the hour instead of exact minute only
-        if now.minute > 5:
+        if self.is_backup_running():
             return
 
-        if now.hour not in (11, 23):
-            return
+        filename = self._backup_filename(datetime.now().strftime("%Y-%m-%d"))
 
-        slot = "am" if now.hour == 11 else "pm"
-        key = f"{today.isoformat()}-{slot}"
+        def fall_back_to_new_file(*_):
+            self.last_auto_sync_key = key
+            self._save_meta()
+            if interactive:
+                self.link_drive(title=filename, db=db)
 
-        if self.last_auto_sync_key == key:
+        if not self.uri:
+            fall_back_to_new_file()
             return
 
-        payload = self._build_backup_payload(db)
+        def on_success():
+            self.last_auto_sync_key = key
+            self._mark_backup_complete()
+            self._save_meta()
+            self._set_status("Auto Drive backup complete")
+
+        def on_failure(err):
+            if not interactive:
+                self._set_status(f"Auto Drive backup failed: {err}")
+            fall_back_to_new_file()
+
+        self._start_backup(
+            db,
+            self.uri,
+            on_success=on_success,
+            on_failure=on_failure,
+        )
 
-        if self.uri:
-            ok, err = self._write_to_uri(self.uri, payload)
-            if ok:
-                self.last_auto_sync_key = key
-                self._mark_backup_complete()
-                self._save_meta()
-                self._set_status("Auto Drive backup complete")
-                return
-
-        filename = f"TxTracker_backup_{today.strftime('%Y-%m-%d')}.json"
-        self.link_drive(title=filename, payload=payload)
-        self.last_auto_sync_key = key
-        self._save_meta()
+    def _write_backup_to_uri(
+        self, uri, db, job=None, incremental=False, journal_seq=None, compress=False
+    ):
+        # returns (kind, seq) for what was written: "json" for the plain
+        # document, "snapshot" or "delta" for the journal
+        if journal_seq is not None:
+            # changes up to the previous acknowledged backup are in the file
+            db.prune_changes(journal_seq)
+        elif incremental:
+            # a new journal starts here: changes from now on are logged, and
+            # the snapshot below covers everything before its sequence
+            db.set_change_log(True)
+
+        with db.read_snapshot():
+            seq = db.change_seq()
+            count = db.count_txns()
+            exported_at = int(time.time())
+
+            if journal_seq is not None and journal_seq <= seq:
+                changes = db.count_changes(journal_seq, seq)
+                if changes == 0:
+                    return "delta", journal_seq
+
+                # past half the rows a fresh snapshot is cheaper to write
+                # and to replay
+                if changes * 2 <= count:
+                    if job is not None:
+                        job.check_cancelled()
+                    chunks = iter_journal_delta(
+                        db.iter_changes(journal_seq, seq),
+                        changes,
+                        journal_seq,
+                        seq,
+                        exported_at,
+                    )
+                    if compress:
+                        chunks = self._gzip_chunks(chunks, changes, exported_at)
+                    if self._append_to_uri(uri, chunks, job):
+                        return "delta", seq
+
+            if job is not None:
+                job.check_cancelled()
+
+            if incremental:
+                chunks = iter_journal_snapshot(db.iter_txns(), count, seq, exported_at)
+            else:
+                chunks = iter_backup_json(db.iter_txns(), count, exported_at)
+            if compress:
+                chunks = self._gzip_chunks(chunks, count, exported_at)
 
-    def _write_to_uri(self, uri, payload):
-        try:
-            out = self._resolver.openOutputStream(uri, "wt")
-            if out is None:
-                return False, "could not open output stream"
+            self._write_chunks_to_uri(uri, "wt", chunks, job)
 
-            data = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
-            out.write(data)
+        if not incremental:
+            db.prune_changes(seq)
+        return ("snapshot" if incremental else "json"), seq
+
+    def _write_snapshot_to_uri(self, uri, db, job=None, compress=False):
+        # binary copy through the SQLite backup machinery; changes up to the
+        # sequence read first are all in the copy, so they can be pruned
+        path = self._scratch_path("backup_snapshot.sqlite3")
+        try:
+            seq = db.change_seq()
+            db.snapshot_to(path, compact=True)
+            if job is not None:
+                job.check_cancelled()
+
+            chunks = iter_file_chunks(path)
+            if compress:
+                chunks = self._gzip_chunks(chunks, None, int(time.time()))
+            self._write_chunks_to_uri(uri, "wt", chunks, job)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+        db.prune_changes(seq)
+        return "sqlite", seq
+
+    def _gzip_chunks(self, chunks, row_count, exported_at):
+        meta = {"schema_version": 1}
+        if row_count is not None:
+            meta["row_count"] = row_count
+        return iter_gzip(chunks, meta, mtime=exported_at)
+
+    def _write_chunks_to_uri(self, uri, mode, chunks, job=None):
+        if job is None:
+            return self._copy_chunks_to_uri(uri, mode, chunks)
+
+        # the backup is staged in a scratch file while cancelling is still
+        # safe; once the output stream is open the copy runs to completion,
+        # since stopping would leave a truncated file in place of the last
+        # good backup
+        path = self._scratch_path("backup_upload.tmp")
+        try:
+            with open(path, "wb") as f:
+                for chunk in chunks:
+                    job.check_cancelled()
+                    f.write(chunk)
+            job.check_cancelled()
+            return self._copy_chunks_to_uri(uri, mode, iter_file_chunks(path))
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _copy_chunks_to_uri(self, uri, mode, chunks):
+        out = self._resolver.openOutputStream(uri, mode)
+        if out is None:
+            raise IOError("could not open output stream")
+
+        written = 0
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
             out.close()
-            return True, None
+        return written
 
-        except Exception as e:
-            return False, str(e)
+    def _append_to_uri(self, uri, chunks, job=None):
+        # some providers ignore the append mode and truncate instead, so
+        # the file size has to grow by exactly what was written; otherwise
+        # the caller rewrites a full snapshot
+        try:
+            size_before = self._uri_size(uri)
+            if size_before is None:
+                return False
+            written = self._write_chunks_to_uri(uri, "wa", chunks, job)
+            return self._uri_size(uri) == size_before + written
+        except BackupCancelled:
+            raise
+        except Exception:
+            return False
+
+    def _uri_size(self, uri):
+        cursor = self._resolver.query(uri, None, None, None, None)
+        if cursor is None:
+            return None
 
-    def _read_text_from_uri(self, uri) -> str:
+        try:
+            if not cursor.moveToFirst():
+                return None
+            index = cursor.getColumnIndex("_size")
+            if index < 0 or cursor.isNull(index):
+                return None
+            return cursor.getLong(index)
+        finally:
+            cursor.close()
+
+    def _iter_bytes_from_uri(self, uri):
         stream = self._resolver.openInputStream(uri)
         if stream is None:
             raise ValueError("could not open selected file")
 
-        chunks = bytearray()
-        while True:
-            b = stream.read()
-            if b == -1:
-                break
-            chunks.append(b)
+        try:
+            yield from iter_stream_chunks(stream)
+        finally:
+            stream.close()
+
+    def note_changes(self, count):
+        self.changes_since_backup += count
+        self._save_meta()
+
+    def sync_change_log(self, db):
+        # the database logs changes only while a journal can take deltas
+        try:
+            db.set_change_log(
+                self._backup_mode() == "incremental" and self.journal_seq is not None
+            )
+        except Exception:
+            pass
+
+    def _journal_matches(self, uri, compress=False):
+        # deltas are only appended in the framing the snapshot was written in
+        return (
+            self.journal_seq is not None
+            and self.journal_uri == uri.toString()
+            and self.journal_gzip == compress
+            and self.journal_deltas < self.FULL_SNAPSHOT_EVERY
+        )
+
+    def _forget_journal(self):
+        self.journal_uri = None
+        self.journal_seq = None
+        self.journal_deltas = 0
+        self._save_meta()
+
+    def _record_backup(self, uri, result, compress=False):
+        kind, seq = result
+        if kind in ("json", "sqlite"):
+            self.journal_uri = None
+            self.journal_seq = None
+            self.journal_deltas = 0
+        elif kind == "snapshot":
+            self.journal_uri = uri.toString()
+            self.journal_seq = seq
+            self.journal_deltas = 0
+            self.journal_gzip = compress
+        elif seq != self.journal_seq:
+            self.journal_seq = seq
+            self.journal_deltas += 1
+        self._save_meta()
 
-        stream.close()
+    def _backup_mode(self):
+        # the journal is opt-in: it is not a JSON document, and older
+        # versions of the app cannot import it
+        return self._get_pref("backup_mode", "full")
 
-        raw = bytes(chunks)
+    def _compress_backups(self):
+        return self._get_pref("backup_compression", "off") == "gzip"
+
+    def _backup_extension(self):
+        extension = {"sqlite": ".sqlite3", "incremental": ".ndjson"}.get(
+            self._backup_mode(), ".json"
+        )
+        return extension + ".gz" if self._compress_backups() else extension
+
+    def _backup_filename(self, day):
+        return f"TxTracker_backup_{day}" + self._backup_extension()
+
+    def _scratch_path(self, name):
+        app = App.get_running_app()
+        base = app.user_data_dir if app else "."
+        return os.path.join(base, name)
+
+    def _get_pref(self, key, default):
         try:
-            return raw.decode("utf-8-sig")
+            app = App.get_running_app()
+            base = app.user_data_dir if app else "."
+            store = JsonStore(f"{base}/settings.json")
+            if store.exists("prefs"):
+                return store.get("prefs").get(key, default)
         except Exception:
-            return raw.decode("utf-8")
+            pass
+        return default
 
     def _mark_backup_complete(self):
         self.last_backup_at = int(time.time())
@@ -305,7 +649,11 @@ class DriveSyncService:
     def _save_link(self):
         try:
             st = self._store()
-            st.put("drive", uri=self.uri.toString() if self.uri else "")
+            st.put(
+                "drive",
+                uri=self.uri.toString() if self.uri else "",
+                format=self.link_format or "",
+            )
         except Exception:
             pass
 
@@ -313,9 +661,12 @@ class DriveSyncService:
         try:
             st = self._store()
             if st.exists("drive"):
-                uri_str = st.get("drive").get("uri")
+                data = st.get("drive")
+                uri_str = data.get("uri")
                 if uri_str:
                     self.uri = self._Uri.parse(uri_str)
+                    # links saved before the format was stored are JSON files
+                    self.link_format = data.get("format") or ".json"
                     return True
         except Exception:
             pass
@@ -328,6 +679,11 @@ class DriveSyncService:
                 "drive_meta",
                 last_auto_sync_key=self.last_auto_sync_key or "",
                 last_backup_at=self.last_backup_at or 0,
+                changes_since_backup=self.changes_since_backup,
+                journal_uri=self.journal_uri or "",
+                journal_seq=-1 if self.journal_seq is None else self.journal_seq,
+                journal_deltas=self.journal_deltas,
+                journal_gzip=self.journal_gzip,
             )
         except Exception:
             pass
@@ -341,11 +697,19 @@ class DriveSyncService:
                 backup_at = data.get("last_backup_at") or None
                 self.last_auto_sync_key = key
                 self.last_backup_at = backup_at
+                self.changes_since_backup = data.get("changes_since_backup", 0)
+
+                journal_seq = data.get("journal_seq", -1)
+                self.journal_uri = data.get("journal_uri") or None
+                self.journal_seq = None if journal_seq < 0 else journal_seq
+                self.journal_deltas = data.get("journal_deltas", 0)
+                self.journal_gzip = bool(data.get("journal_gzip", False))
         except Exception:
             pass
 
     def _clear_pending(self):
-        self._pending_payload = None
+        self._pending_backup_db = None
         self._pending_action = None
+        self._pending_link_format = None
         self._pending_import_db = None
         self._pending_import_complete_cb = None
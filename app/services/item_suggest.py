@@ -0,0 +1,101 @@
+import string
+import threading
+from collections import OrderedDict
+from datetime import date
+
+# SQLite's LOWER() only folds ASCII, and item_stats keys are made with it
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def item_key(text):
+    return text.strip().translate(_ASCII_LOWER)
+
+
+class ItemSuggestions:
+    # ranked completions for the item field, read from the item_stats table
+    # the database keeps up to date. results are cached per prefix in a
+    # bounded LRU that is dropped whenever transactions change
+    CACHE_SIZE = 256
+    CANDIDATES = 50
+    RANKED = 10
+
+    # a use loses half its weight every this many days
+    HALF_LIFE_DAYS = 30
+
+    def __init__(self, db):
+        self.db = db
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        db.add_change_listener(self._on_db_change)
+
+    def suggest(self, text, limit=3):
+        key = item_key(text)
+        if not key:
+            return []
+
+        with self._lock:
+            entry = self._cached(key)
+            generation = self._generation
+
+        if entry is None:
+            rows = self.db.item_suggestions(key, self.CANDIDATES)
+            entry = (self._rank(rows), len(rows) < self.CANDIDATES)
+            with self._lock:
+                if generation == self._generation:
+                    self._store(key, entry)
+
+        return entry[0][:limit]
+
+    def _cached(self, key):
+        # a shorter prefix whose lookup returned every match answers longer
+        # ones too, so typing a word costs one query
+        for end in range(len(key), 0, -1):
+            entry = self._cache.get(key[:end])
+            if entry is None:
+                continue
+
+            self._cache.move_to_end(key[:end])
+            if end == len(key):
+                return entry
+
+            ranked, complete = entry
+            if not complete:
+                return None
+
+            entry = (
+                [s for s in ranked if item_key(s["item"]).startswith(key)],
+                True,
+            )
+            self._store(key, entry)
+            return entry
+        return None
+
+    def _store(self, key, entry):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def _rank(self, rows):
+        today = date.today()
+
+        def score(row):
+            try:
+                seen = date.fromisoformat(row["last_seen"][:10])
+                age = max(0, (today - seen).days)
+            except ValueError:
+                age = 365
+            return row["uses"] * 0.5 ** (age / self.HALF_LIFE_DAYS)
+
+        # a complete entry keeps every match so longer prefixes can filter it
+        ranked = sorted(rows, key=score, reverse=True)
+        if len(rows) >= self.CANDIDATES:
+            ranked = ranked[: self.RANKED]
+        return ranked
+
+    def _on_db_change(self, kind, ids):
+        # may run on the write-behind thread
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
@@ -1,5 +1,6 @@
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
 from datetime import datetime, date, timedelta
+from functools import lru_cache
 
 
 def rupees_to_paise(text):
@@ -20,9 +21,14 @@ def rupees_to_paise(text):
     return paise
 
 
+# list screens format the same amounts and times over and over
+@lru_cache(maxsize=4096)
 def paise_to_rupees(paise):
-    decimal = Decimal(int(paise)) / Decimal(100)
-    return f"{decimal:.2f}"
+    # whole paise split exactly; same text as Decimal(paise) / 100 gives
+    paise = int(paise)
+    sign = "-" if paise < 0 else ""
+    rupees, rest = divmod(abs(paise), 100)
+    return f"{sign}{rupees}.{rest:02d}"
 
 
 def today_date_str():
@@ -50,6 +56,7 @@ def start_of_year(d: date) -> date:
     return d.replace(month=1, day=1)
 
 
+@lru_cache(maxsize=1440)
 def time_24_to_12(time_str: str) -> str:
     hh, mm = time_str.split(":")
     h = int(hh)
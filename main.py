@@ -28,6 +28,8 @@ from app.screens.add import AddScreen
 from app.screens.history import HistoryScreen
 from app.screens.reports import ReportScreen
 from app.screens.settings import SettingsScreen
+from app.services.backup_scheduler import BackupScheduler
+from app.services.change_bus import ChangeBus
 from app.services.drive_sync import DriveSyncService
 
 
@@ -98,7 +100,11 @@ class RootUI(BoxLayout):
         self.db = DataBase(path=db_path)
         self.db.init_database()
 
+        self.change_bus = ChangeBus()
+        self.change_bus.attach(self.db)
+
         self.drive_sync = DriveSyncService()
+        self.drive_sync.sync_change_log(self.db)
 
         Window.bind(size=lambda *_: self._update_dock_width())
         Window.bind(on_keyboard=self._on_window_keyboard)
@@ -151,8 +157,9 @@ class RootUI(BoxLayout):
         self.reports_screen = ReportScreen(db=self.db)
         self.settings_screen = SettingsScreen(db=self.db, drive_sync=self.drive_sync)
 
-        self.history_screen.refresh()
-        self.reports_screen.refresh()
+        # both build on first show and after that only when data changed
+        self.change_bus.subscribe(self.history_screen.on_db_changes)
+        self.change_bus.subscribe(self.reports_screen.on_db_changes)
 
         add_screen = Screen(name="add")
         add_screen.add_widget(self.add_screen)
@@ -423,17 +430,7 @@ class RootUI(BoxLayout):
             return
 
         self._last_main_screen = tab_name
-
-        if tab_name == "history":
-            try:
-                self.history_screen.refresh()
-            except Exception:
-                pass
-        elif tab_name == "reports":
-            try:
-                self.reports_screen.refresh()
-            except Exception:
-                pass
+        self._set_active_screen(tab_name)
 
         def do_switch(*args):
             self.screen_manager.current = tab_name
@@ -465,6 +462,7 @@ class RootUI(BoxLayout):
             duration=duration,
         )
         self.screen_manager.current = "settings"
+        self._set_active_screen("settings")
         self._update_top_bar("settings")
         self._hide_dock()
 
@@ -488,18 +486,9 @@ class RootUI(BoxLayout):
         self._update_top_bar(target)
         self._show_dock()
         self._update_dock_state(target)
+        self._set_active_screen(target)
 
-        if target == "history":
-            try:
-                self.history_screen.refresh()
-            except Exception:
-                pass
-        elif target == "reports":
-            try:
-                self.reports_screen.refresh()
-            except Exception:
-                pass
-        elif target == "add":
+        if target == "add":
             try:
                 self.add_screen.on_open()
             except Exception:
@@ -553,17 +542,17 @@ class RootUI(BoxLayout):
         Animation.cancel_all(self, "bg_u")
         Animation(bg_u=target_u, duration=duration, t="out_quad").start(self)
 
-    def refresh_reports(self):
-        try:
-            self.reports_screen.refresh()
-        except Exception:
-            pass
-
-    def refresh_history(self):
-        try:
-            self.history_screen.refresh()
-        except Exception:
-            pass
+    def _set_active_screen(self, name):
+        # an active screen refreshes as changes arrive, the others only
+        # remember that they are stale
+        for screen_name, screen in (
+            ("history", self.history_screen),
+            ("reports", self.reports_screen),
+        ):
+            try:
+                screen.set_active(name == screen_name)
+            except Exception:
+                pass
 
 
 class TxTrackerApp(MDApp):
@@ -574,32 +563,46 @@ class TxTrackerApp(MDApp):
         self.theme_cls.accent_palette = "Red"
         self.theme_cls.material_style = "M3"
 
-        Clock.schedule_interval(self._auto_sync_tick, 60)
+        self.backup_scheduler = BackupScheduler(
+            self.root_ui.drive_sync, self.root_ui.db
+        )
+        self.backup_scheduler.start()
         self._apply_android_window_mode()
 
     def on_resume(self):
         self._apply_android_window_mode()
+        # the clock stood still while paused
+        self.reschedule_backups()
 
-    def build(self):
-        register_all_fonts()
-        self.root_ui = RootUI()
-        return self.root_ui
+    def on_stop(self):
+        try:
+            self.backup_scheduler.stop()
+        except Exception:
+            pass
+
+        try:
+            self.root_ui.drive_sync.stop()
+        except Exception:
+            pass
 
-    def refresh_reports(self):
         try:
-            self.root_ui.refresh_reports()
+            self.root_ui.history_screen.stop_builder()
         except Exception:
             pass
 
-    def refresh_history(self):
         try:
-            self.root_ui.refresh_history()
+            self.root_ui.db.close()
         except Exception:
             pass
 
-    def _auto_sync_tick(self, *_):
+    def build(self):
+        register_all_fonts()
+        self.root_ui = RootUI()
+        return self.root_ui
+
+    def reschedule_backups(self, *_):
         try:
-            self.root_ui.drive_sync.auto_sync_if_due(self.root_ui.db)
+            self.backup_scheduler.reschedule()
         except Exception:
             pass
 
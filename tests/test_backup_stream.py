@@ -0,0 +1,181 @@
+import json
+import unittest
+from app.services.backup_stream import (
+    MAX_VALUE_CHARS,
+    BackupFormatError,
+    iter_backup_bytes,
+    iter_backup_json,
+    iter_backup_records,
+    iter_checked_records,
+    iter_decoded_text,
+    iter_gzip,
+    iter_journal_changes,
+    iter_journal_delta,
+    iter_journal_snapshot,
+)
+
+CHUNK_SIZES = (1, 2, 7, 64, 4096)
+
+ROWS = [
+    {
+        "id": 3,
+        "date": "2025-01-03",
+        "time": "09:30",
+        "item": "chai é ₹ \U0001f375",
+        "amount": 1200,
+        "note": 'quote " backslash \\ tab \t ctrl \x01',
+    },
+    {
+        "id": 2,
+        "date": "2025-01-02",
+        "time": "21:05",
+        "item": "x" * 300,
+        "amount": 99999999999,
+        "note": "",
+    },
+    {
+        "id": 1,
+        "date": "2025-01-01",
+        "time": "00:00",
+        "item": "राशन",
+        "amount": 1,
+        "note": "line\nbreak",
+    },
+]
+
+
+def rechunk(data, size):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def read_records(data, size):
+    members = []
+    raw = iter_backup_bytes(rechunk(data, size), members)
+    records = iter_backup_records(iter_decoded_text(raw))
+    return list(iter_checked_records(records, members))
+
+
+def rows_of(records):
+    return [value for kind, value in records if kind == "row"]
+
+
+def backup_json(rows=ROWS, compact=None):
+    return b"".join(iter_backup_json(iter(rows), len(rows), 1700000000, compact))
+
+
+def gzipped(data, row_count=None):
+    meta = {"schema_version": 1}
+    if row_count is not None:
+        meta["row_count"] = row_count
+    return b"".join(iter_gzip(rechunk(data, 100), meta, mtime=1700000000))
+
+
+class RoundTripTest(unittest.TestCase):
+    def test_json_document(self):
+        for compact in (False, True):
+            data = backup_json(compact=compact)
+            self.assertEqual(json.loads(data)["transactions"], ROWS)
+            for size in CHUNK_SIZES:
+                with self.subTest(compact=compact, size=size):
+                    self.assertEqual(rows_of(read_records(data, size)), ROWS)
+
+    def test_indented_document_matches_json_dumps(self):
+        payload = json.loads(backup_json(compact=False))
+        expected = json.dumps(payload, indent=2, ensure_ascii=False)
+        self.assertEqual(backup_json(compact=False).decode("utf-8"), expected)
+
+    def test_empty_document(self):
+        for compact in (False, True):
+            data = backup_json([], compact=compact)
+            self.assertEqual(rows_of(read_records(data, 3)), [])
+
+    def test_bare_list_and_line_delimited_rows(self):
+        listed = json.dumps(ROWS).encode("utf-8")
+        lines = "".join(json.dumps(r) + "\n" for r in ROWS).encode("utf-8")
+        for data in (listed, lines, b"\xef\xbb\xbf" + lines):
+            for size in CHUNK_SIZES:
+                with self.subTest(data=data[:8], size=size):
+                    self.assertEqual(rows_of(read_records(data, size)), ROWS)
+
+    def test_gzip(self):
+        data = gzipped(backup_json(), row_count=len(ROWS))
+        for size in CHUNK_SIZES:
+            with self.subTest(size=size):
+                self.assertEqual(rows_of(read_records(data, size)), ROWS)
+
+    def test_journal_snapshot_and_deltas(self):
+        snapshot = b"".join(iter_journal_snapshot(iter(ROWS), len(ROWS), 5, 0))
+        changes = [
+            dict(ROWS[0], op="upsert", deleted=1),
+            {k: ROWS[1][k] for k in ("date", "time", "item", "amount", "note")},
+        ]
+        changes[1]["op"] = "delete"
+        delta = b"".join(iter_journal_delta(iter(changes), 2, 5, 9, 0))
+
+        expected = [dict(r, op="upsert", deleted=0) for r in ROWS] + changes
+        journals = (
+            snapshot + delta,
+            gzipped(snapshot, len(ROWS)) + gzipped(delta, len(changes)),
+        )
+        for data in journals:
+            for size in CHUNK_SIZES:
+                with self.subTest(gzip=data[:2] == b"\x1f\x8b", size=size):
+                    records = read_records(data, size)
+                    self.assertEqual(list(iter_journal_changes(records)), expected)
+
+
+class DamagedInputTest(unittest.TestCase):
+    def assert_rejected(self, data, size=7):
+        with self.assertRaises(BackupFormatError):
+            read_records(data, size)
+
+    def test_truncated_json(self):
+        data = backup_json(compact=True)
+        for cut in range(len(data)):
+            with self.subTest(cut=cut):
+                self.assert_rejected(data[:cut])
+
+    def test_truncated_gzip(self):
+        data = gzipped(backup_json(), row_count=len(ROWS))
+        for cut in range(len(data)):
+            with self.subTest(cut=cut):
+                self.assert_rejected(data[:cut])
+
+    def test_corrupted_gzip_payload(self):
+        data = bytearray(gzipped(backup_json(), row_count=len(ROWS)))
+        data[-12] ^= 0xFF
+        self.assert_rejected(bytes(data))
+
+    def test_corrupted_gzip_header(self):
+        data = bytearray(gzipped(backup_json(), row_count=len(ROWS)))
+        data[14] ^= 0x01
+        self.assert_rejected(bytes(data))
+
+    def test_row_count_mismatch(self):
+        self.assert_rejected(gzipped(backup_json(), row_count=len(ROWS) + 1))
+
+    def test_syntax_error_stops_reading(self):
+        consumed = []
+
+        def chunks():
+            yield b'{"schema_version":1,"transactions":[{"date":}'
+            for i in range(1000):
+                consumed.append(i)
+                yield b" " * 1024
+
+        with self.assertRaises(BackupFormatError):
+            list(iter_backup_records(iter_decoded_text(chunks())))
+        self.assertLess(len(consumed), 2)
+
+    def test_oversized_value(self):
+        data = b'[{"item":"' + b"x" * (MAX_VALUE_CHARS + 1024)
+        self.assert_rejected(data, size=64 * 1024)
+
+    def test_not_json(self):
+        for data in (b"", b"   ", b"hello", b"[1,", b'{"transactions":{}}'):
+            with self.subTest(data=data):
+                self.assert_rejected(data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+from app.db import DataBase
+
+
+class ImportRowTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DataBase(":memory:")
+        self.db.init_database()
+
+    def tearDown(self):
+        self.db.close()
+
+    def rows(self):
+        amounts = (500, 2**63, -(2**70), DataBase.MAX_AMOUNT)
+        return [
+            {"date": "2025-01-01", "time": "10:00", "item": f"i{n}", "amount": a}
+            for n, a in enumerate(amounts)
+        ]
+
+    def test_out_of_range_amounts_are_skipped_not_fatal(self):
+        self.assertEqual(self.db.import_transactions(self.rows()), (2, 2))
+
+    def test_out_of_range_amounts_are_skipped_when_replaying(self):
+        changes = [dict(r, op="upsert") for r in self.rows()]
+        self.assertEqual(self.db.apply_changes(changes), (2, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
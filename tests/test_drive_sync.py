@@ -0,0 +1,190 @@
+import os
+import tempfile
+import unittest
+from app.db import DataBase
+from app.services.backup_stream import MemoryInputStream
+
+try:
+    import kivy
+except ImportError:
+    kivy = None
+
+
+class _Uri:
+    def __init__(self, name):
+        self.name = name
+
+    def toString(self):
+        return self.name
+
+
+class _Output:
+    def __init__(self, files, name, mode):
+        self.files = files
+        self.name = name
+        if mode == "wt" or name not in files:
+            files[name] = b""
+
+    def write(self, data):
+        self.files[self.name] += bytes(data)
+
+    def close(self):
+        pass
+
+
+class _SizeCursor:
+    def __init__(self, size):
+        self.size = size
+
+    def moveToFirst(self):
+        return True
+
+    def getColumnIndex(self, name):
+        return 0
+
+    def isNull(self, index):
+        return False
+
+    def getLong(self, index):
+        return self.size
+
+    def close(self):
+        pass
+
+
+class _Resolver:
+    # content resolver over an in-memory dict that honours append mode
+    def __init__(self):
+        self.files = {}
+
+    def openOutputStream(self, uri, mode):
+        return _Output(self.files, uri.toString(), mode)
+
+    def query(self, uri, *args):
+        return _SizeCursor(len(self.files.get(uri.toString(), b"")))
+
+    def openInputStream(self, uri):
+        return MemoryInputStream(self.files[uri.toString()])
+
+
+class _InlineWorker:
+    # runs a submitted job when asked, the way the worker thread and the
+    # Clock callback would
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, run, on_done=None, on_status=None):
+        from app.services.backup_worker import BackupJob
+
+        job = BackupJob(run, on_done=on_done)
+        self.pending.append(job)
+        return job
+
+    def run_pending(self):
+        while self.pending:
+            job = self.pending.pop(0)
+            try:
+                result, error = job.run(job), None
+            except Exception as e:
+                result, error = None, e
+            job.on_done(result, error)
+
+    def stop(self):
+        self.pending = []
+
+
+@unittest.skipIf(kivy is None, "kivy is not installed")
+class JournalBackupTest(unittest.TestCase):
+    def setUp(self):
+        from app.services.drive_sync import DriveSyncService
+
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+
+        self.db = DataBase(os.path.join(self._tmp.name, "source.sqlite3"))
+        self.db.init_database()
+
+        self.sync = DriveSyncService()
+        self.sync._resolver = _Resolver()
+        self.sync._worker = _InlineWorker()
+        self.sync._backup_mode = lambda: "incremental"
+        self.sync.uri = _Uri("journal")
+        self.sync.link_format = self.sync._backup_extension()
+        self.sync.sync_change_log(self.db)
+
+        self.kinds = []
+        self.sync._record_backup = self._recording(self.sync._record_backup)
+
+    def tearDown(self):
+        self.sync.stop()
+        self.db.close()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def _recording(self, record_backup):
+        def record(uri, result, compress=False):
+            self.kinds.append(result[0])
+            record_backup(uri, result, compress)
+
+        return record
+
+    def backup(self):
+        errors = []
+        self.sync._start_backup(
+            self.db, self.sync.uri, lambda: None, on_failure=errors.append
+        )
+        self.sync._worker.run_pending()
+        self.assertEqual(errors, [])
+
+    def restore(self):
+        target = DataBase(os.path.join(self._tmp.name, "restored.sqlite3"))
+        target.init_database()
+        self.sync._pending_import_db = target
+        self.sync._handle_import_json(None, self.sync.uri)
+        try:
+            return self.live_items(target)
+        finally:
+            target.close()
+
+    def live_items(self, db):
+        rows = db.connect().execute(
+            "SELECT item FROM transactions WHERE deleted = 0 ORDER BY item"
+        )
+        return [r["item"] for r in rows]
+
+    def seed(self, count=10):
+        # deltas are only appended while they stay under half the rows
+        for i in range(count):
+            self.db.add_transaction("2024-12-01", "09:00", f"seed {i:02d}", 10, "")
+
+    def test_edits_after_the_first_snapshot_reach_the_journal(self):
+        self.seed()
+        self.db.add_transaction("2025-01-01", "10:00", "first", 100, "")
+        self.backup()
+
+        self.db.add_transaction("2025-01-02", "10:00", "second", 200, "")
+        self.db.add_transaction("2025-01-03", "10:00", "third", 300, "")
+        self.backup()
+
+        self.assertEqual(self.kinds, ["snapshot", "delta"])
+        self.assertEqual(self.restore(), self.live_items(self.db))
+        self.assertEqual(len(self.live_items(self.db)), 13)
+
+    def test_deletes_between_deltas_are_restored(self):
+        self.seed()
+        first = self.db.add_transaction("2025-01-01", "10:00", "first", 100, "")
+        self.db.add_transaction("2025-01-01", "11:00", "kept", 100, "")
+        self.backup()
+
+        self.db.soft_delete(first)
+        self.backup()
+        self.db.add_transaction("2025-01-02", "10:00", "later", 200, "")
+        self.backup()
+
+        self.assertEqual(self.kinds, ["snapshot", "delta", "delta"])
+        self.assertEqual(self.restore(), self.live_items(self.db))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from datetime import date
+from app.db import DataBase
+
+
+class QueryPlanTest(unittest.TestCase):
+    # report reads must be answered from daily_totals' primary key and never
+    # touch transactions, which has no index serving them
+    def setUp(self):
+        self.db = DataBase(":memory:")
+        self.db.init_database()
+
+    def tearDown(self):
+        self.db.close()
+
+    def plans(self, read):
+        # plans of the SELECTs `read` runs, with their parameters bound
+        connect = self.db.connect()
+        statements = []
+        connect.set_trace_callback(statements.append)
+        try:
+            read()
+        finally:
+            connect.set_trace_callback(None)
+
+        plans = []
+        for sql in statements:
+            if sql.lstrip().startswith("SELECT"):
+                rows = connect.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plans.append(" | ".join(r["detail"] for r in rows))
+        self.assertTrue(plans)
+        return plans
+
+    def assert_range_reads(self, read):
+        for plan in self.plans(read):
+            self.assertIn("SEARCH daily_totals USING PRIMARY KEY", plan)
+            self.assertNotIn("transactions", plan)
+
+    def test_report_bundle(self):
+        self.assert_range_reads(lambda: self.db.report_bundle(date(2025, 3, 4)))
+
+    def test_sum_between_dates(self):
+        self.assert_range_reads(
+            lambda: self.db.sum_between_dates("2025-03-01", "2025-04-01")
+        )
+
+    def test_period_totals(self):
+        self.assert_range_reads(lambda: self.db.week_daily_totals(date(2025, 3, 2)))
+        self.assert_range_reads(lambda: self.db.month_daily_totals(date(2025, 3, 1)))
+        self.assert_range_reads(lambda: self.db.year_monthly_totals(date(2025, 1, 1)))
+
+    def test_month_counts_reads_only_the_rollup(self):
+        for plan in self.plans(self.db.month_counts):
+            self.assertIn("daily_totals", plan)
+            self.assertNotIn("transactions", plan)
+
+    def test_live_row_index_is_gone(self):
+        names = {
+            r["name"]
+            for r in self.db.connect().execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        }
+        self.assertNotIn("idx_tx_live_date_amount", names)
+
+
+if __name__ == "__main__":
+    unittest.main()